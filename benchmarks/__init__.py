@@ -0,0 +1,8 @@
+'''
+The benchmarks of the grapy hot paths, they are not installed with the
+package, run them from the source tree:
+
+    python -m benchmarks
+    python -m benchmarks --pages 5000 --fanout 20 --save baseline.json
+    python -m benchmarks --compare baseline.json
+'''
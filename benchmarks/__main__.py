@@ -0,0 +1,84 @@
+from .crawl import run_crawl
+from .micro import run_micro
+import argparse
+import logging
+import json
+import sys
+
+# the stats are better when they are lower, the others are higher
+LOWER_IS_BETTER = ['p50_ms', 'p99_ms', 'cpu_ms_per_page', 'peak_rss_mb']
+
+# the stats describe the run, they are not compared
+SKIP_KEYS = ['pages', 'items', 'seconds']
+
+
+def compare(stats, baseline, threshold):
+    '''print the changes to the baseline, return the regressed stats'''
+    regressions = []
+    for key, value in stats.items():
+        old = baseline.get(key)
+        if key in SKIP_KEYS or not old:
+            continue
+
+        change = (value - old) / old
+        if key in LOWER_IS_BETTER:
+            worse = change > threshold
+        else:
+            worse = -change > threshold
+
+        mark = 'REGRESSION' if worse else ''
+        print(f'{key:<24}{old:>14.2f}{value:>14.2f}{change:>+10.1%}  {mark}')
+        if worse:
+            regressions.append(key)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='grapy benchmarks')
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--fanout', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=16384)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--iterations',
+                        type=int,
+                        default=10000,
+                        help='the iterations of the micro benchmarks')
+    parser.add_argument('--only', choices=['crawl', 'micro'])
+    parser.add_argument('--save', help='save the stats as the baseline')
+    parser.add_argument('--compare', help='compare to the baseline')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=0.1,
+                        help='the allowed regression, default is 10%%')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    stats = {}
+    if args.only != 'micro':
+        stats.update(
+            run_crawl(args.pages, args.fanout, args.page_size,
+                      args.concurrency))
+    if args.only != 'crawl':
+        stats.update(run_micro(args.iterations))
+
+    for key, value in stats.items():
+        print(f'{key:<24}{value:>14.2f}')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        print(f'{"":<24}{"baseline":>14}{"current":>14}{"change":>10}')
+        if compare(stats, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from grapy import Request, BaseSpider, Item
+from grapy.core import Engine
+from grapy.sched import Scheduler
+from grapy.middleware import RequestFilter
+from grapy.client_pool import ClientPool
+from grapy.replay import AssignTransport
+from time import time, process_time
+import resource
+import asyncio
+import httpx
+
+__all__ = ['run_crawl', 'make_page']
+
+BASE_URL = 'http://bench.local'
+
+
+def make_page(n, fanout, pages, page_size):
+    '''the html of page n, it links to the children pages on a tree'''
+    links = []
+    for i in range(n * fanout + 1, min(n * fanout + fanout + 1, pages)):
+        links.append(f'<li><a href="/p/{i}">page {i}</a></li>')
+
+    head = f'<html><head><title>page {n}</title></head><body><ul>'
+    tail = '</ul></body></html>'
+    html = head + ''.join(links) + tail
+    padding = max(page_size - len(html), 0)
+    para = '<p>grapy benchmark padding text.</p>'
+    body = para * (padding // len(para) + 1)
+    return head + ''.join(links) + '</ul>' + body[:padding] + '</body></html>'
+
+
+def make_transport(fanout, pages, page_size):
+
+    def handler(request):
+        n = int(request.url.path.rsplit('/', 1)[-1])
+        content = bytes(make_page(n, fanout, pages, page_size), 'utf-8')
+        return httpx.Response(200,
+                              headers={'content-type': 'text/html'},
+                              content=content)
+
+    return httpx.MockTransport(handler)
+
+
+class BenchItem(Item):
+    pass
+
+
+class BenchSpider(BaseSpider):
+    name = 'bench'
+
+    def start_request(self):
+        return [Request(f'{BASE_URL}/p/0')]
+
+    def parse(self, rsp):
+        soup = rsp.soup
+        for a in soup.select('a'):
+            yield Request(BASE_URL + a['href'])
+
+        yield BenchItem({'url': rsp.url, 'title': soup.title.get_text()})
+
+
+async def _crawl(pages, fanout, page_size, concurrency):
+    engine = Engine()
+    pool = ClientPool()
+    items = []
+
+    def pipeline(item):
+        items.append(item)
+
+    engine.set_client_pool(pool)
+    engine.set_sched(Scheduler(size=concurrency))
+    engine.set_spiders([BenchSpider()])
+    engine.set_middlewares([
+        AssignTransport(make_transport(fanout, pages, page_size)),
+        RequestFilter()
+    ])
+    engine.set_pipelines([pipeline])
+
+    try:
+        await engine.start()
+        await engine.sched.join()
+    finally:
+        await pool.close()
+
+    return engine.metrics.histograms['bench']['process'], items
+
+
+def run_crawl(pages=1000, fanout=10, page_size=16384, concurrency=20):
+    '''
+    run a synthetic crawl on a mock transport, return the stats:
+    requests/sec, p50/p99 latency of a page, peak rss and cpu per page
+    '''
+    start_time = time()
+    start_cpu = process_time()
+    hist, items = asyncio.run(_crawl(pages, fanout, page_size, concurrency))
+    spent = time() - start_time
+    cpu = process_time() - start_cpu
+    count = hist.count
+
+    return {
+        'pages': count,
+        'items': len(items),
+        'seconds': spent,
+        'req_per_sec': count / spent if spent else 0,
+        'p50_ms': hist.percentile(0.5) * 1000,
+        'p99_ms': hist.percentile(0.99) * 1000,
+        'cpu_ms_per_page': cpu / count * 1000 if count else 0,
+        # ru_maxrss is KB on linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+        1024,
+    }
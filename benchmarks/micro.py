@@ -0,0 +1,80 @@
+from grapy import Request, Response, Item
+from grapy.core import Engine
+from grapy.core.item import load_item
+from .crawl import make_page
+from time import perf_counter
+import asyncio
+
+__all__ = ['run_micro']
+
+
+class Noop(object):
+
+    def before_request(self, req):
+        return req
+
+
+def _ops(func, iterations):
+    start_time = perf_counter()
+    for _ in range(iterations):
+        func()
+    spent = perf_counter() - start_time
+    return iterations / spent if spent else 0
+
+
+def bench_request(iterations):
+    req = Request('http://bench.local/p/1',
+                  callback='parse_item',
+                  callback_args=[1, 'a'],
+                  spider='bench',
+                  headers={'user-agent': 'grapy'})
+    payload = bytes(req)
+    return {
+        'request_pack': _ops(lambda: bytes(req), iterations),
+        'request_build': _ops(lambda: Request.build(payload), iterations),
+    }
+
+
+def bench_item(iterations):
+    item = Item({'url': 'http://bench.local/p/1', 'title': 'page 1'})
+    payload = bytes(item)
+    return {
+        'item_bytes': _ops(lambda: bytes(item), iterations),
+        'item_load': _ops(lambda: load_item(payload), iterations),
+    }
+
+
+def bench_soup(iterations, page_size=16384):
+    content = bytes(make_page(1, 10, 1000, page_size), 'utf-8')
+
+    def parse():
+        rsp = Response('http://bench.local/p/1', content, None, 200,
+                       'text/html', {})
+        return rsp.soup
+
+    return {'response_soup': _ops(parse, max(iterations // 100, 1))}
+
+
+def bench_middleware(iterations):
+    engine = Engine()
+    engine.set_middlewares([Noop(), Noop(), Noop(), Noop(), Noop()])
+    req = Request('http://bench.local/p/1')
+
+    async def run():
+        start_time = perf_counter()
+        for _ in range(iterations):
+            await engine.process_middleware('before_request', req)
+        return perf_counter() - start_time
+
+    spent = asyncio.run(run())
+    return {'process_middleware': iterations / spent if spent else 0}
+
+
+def run_micro(iterations=10000):
+    '''run the micro benchmarks, return the operations/sec of them'''
+    stats = {}
+    stats.update(bench_request(iterations))
+    stats.update(bench_item(iterations))
+    stats.update(bench_soup(iterations))
+    stats.update(bench_middleware(iterations))
+    return stats
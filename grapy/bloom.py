@@ -0,0 +1,183 @@
+import hashlib
+import struct
+import mmap
+import math
+import os
+
+__all__ = ['BloomFilter', 'ScalableBloomFilter']
+
+_header = struct.Struct('<8sQQQQ')
+_magic = b'GRBLOOM1'
+_hash = struct.Struct('<QQ')
+
+
+class BloomFilter(object):
+    '''
+    A fixed size bloom filter, the bit array is kept in memory or memory
+    mapped from a file, so it survives restarts.
+
+    @capacity: the max elements for the error_rate
+    @error_rate: the false positive rate
+    @path: the file to map, it is loaded if exists
+    '''
+
+    def __init__(self, capacity=10000, error_rate=0.001, path=None):
+        self.path = path
+        self._fp = None
+
+        if path and os.path.exists(path):
+            self._fp = open(path, 'r+b')
+            self._buf = mmap.mmap(self._fp.fileno(), 0)
+            magic, self.num_bits, self.num_hashes, self.capacity, _ = \
+                _header.unpack_from(self._buf)
+            if magic != _magic:
+                raise ValueError(f'{path} is not a bloom filter file')
+            return
+
+        self.capacity = capacity
+        self.num_bits = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2)**2))
+        self.num_hashes = max(
+            1, round(self.num_bits / capacity * math.log(2)))
+        size = _header.size + (self.num_bits + 7) // 8
+
+        if path:
+            self._fp = open(path, 'w+b')
+            self._fp.truncate(size)
+            self._buf = mmap.mmap(self._fp.fileno(), size)
+        else:
+            self._buf = bytearray(size)
+
+        _header.pack_into(self._buf, 0, _magic, self.num_bits,
+                          self.num_hashes, self.capacity, 0)
+
+    @property
+    def count(self):
+        return _header.unpack_from(self._buf)[4]
+
+    def _positions(self, key):
+        if isinstance(key, str):
+            key = bytes(key, 'utf-8')
+        h1, h2 = _hash.unpack(hashlib.blake2b(key, digest_size=16).digest())
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % num_bits
+
+    def __contains__(self, key):
+        buf = self._buf
+        offset = _header.size
+        for pos in self._positions(key):
+            if not buf[offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        '''add the key, return True if it maybe already exists'''
+        buf = self._buf
+        offset = _header.size
+        exists = True
+        for pos in self._positions(key):
+            idx = offset + (pos >> 3)
+            bit = 1 << (pos & 7)
+            if not buf[idx] & bit:
+                buf[idx] |= bit
+                exists = False
+
+        if not exists:
+            struct.pack_into('<Q', buf, _header.size - 8, self.count + 1)
+        return exists
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def sync(self):
+        if self._fp is not None:
+            self._buf.flush()
+
+    def close(self):
+        if self._fp is not None:
+            self._buf.close()
+            self._fp.close()
+            self._fp = None
+
+
+class ScalableBloomFilter(object):
+    '''
+    A bloom filter grows automatically, a new slice is added when the last
+    one is full, the error rate of slices are tightened so the total
+    false positive rate stays under error_rate.
+
+    @initial_capacity: the capacity of the first slice
+    @error_rate: the target false positive rate
+    @growth: the capacity scale of the next slice
+    @tightening: the error rate scale of the next slice
+    @path: a directory to keep the slices, they are loaded if exist
+
+    >>> RequestFilter(ScalableBloomFilter(path='dedupe'))
+    '''
+
+    def __init__(self,
+                 initial_capacity=10000,
+                 error_rate=0.001,
+                 growth=2,
+                 tightening=0.5,
+                 path=None):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.path = path
+        self.filters = []
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            names = [n for n in os.listdir(path) if n.endswith('.bloom')]
+            names.sort(key=lambda n: int(n[:-6]))
+            for name in names:
+                self.filters.append(BloomFilter(path=os.path.join(path, name)))
+
+        if not self.filters:
+            self._add_filter()
+
+    def _add_filter(self):
+        idx = len(self.filters)
+        capacity = self.initial_capacity * self.growth**idx
+        error_rate = self.error_rate * (1 - self.tightening) * \
+            self.tightening**idx
+        path = None
+        if self.path:
+            path = os.path.join(self.path, f'{idx}.bloom')
+        self.filters.append(BloomFilter(capacity, error_rate, path))
+
+    @property
+    def count(self):
+        return sum(f.count for f in self.filters)
+
+    @property
+    def capacity(self):
+        return sum(f.capacity for f in self.filters)
+
+    def __contains__(self, key):
+        for f in reversed(self.filters):
+            if key in f:
+                return True
+        return False
+
+    def add(self, key):
+        '''add the key, return True if it maybe already exists'''
+        if key in self:
+            return True
+
+        if self.filters[-1].is_full():
+            self._add_filter()
+
+        self.filters[-1].add(key)
+        return False
+
+    def sync(self):
+        for f in self.filters:
+            f.sync()
+
+    def close(self):
+        for f in self.filters:
+            f.close()
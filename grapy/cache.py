@@ -0,0 +1,205 @@
+from email.utils import parsedate_to_datetime
+from .request import Request
+from .response import Response
+from time import time
+import sqlite3
+import logging
+import json
+import re
+
+__all__ = ['HttpCache']
+
+logger = logging.getLogger(__name__)
+
+re_max_age = re.compile(r'max-age\s*=\s*(\d+)', re.I)
+
+
+def _get_expires(headers, default_ttl):
+    '''the expire timestamp by Cache-Control or Expires, None is no-store'''
+    cc = headers.get('cache-control', '').lower()
+    if 'no-store' in cc:
+        return None
+
+    now = time()
+    if 'no-cache' in cc:
+        return now
+
+    m = re_max_age.search(cc)
+    if m:
+        return now + int(m.group(1))
+
+    expires = headers.get('expires')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except Exception:
+            return now
+
+    return now + default_ttl
+
+
+class HttpCache(object):
+    '''
+    A local HTTP cache on SQLite, keyed by BaseRequest.get_hash().
+
+    A fresh response (by Cache-Control or Expires) is served without the
+    network, a stale one is revalidated with If-None-Match and
+    If-Modified-Since, the 304 response is replaced by the cached one.
+    The least recently used responses are evicted when the cached bodies
+    are over max_size bytes.
+
+    It must be put before check_response_status, otherwise the 304
+    responses are retried.
+
+    @path: the database file
+    @max_size: the max bytes of the cached bodies
+    @default_ttl: the fresh seconds of the responses without Cache-Control
+                  or Expires, 0 always revalidates them
+
+    >>> cache = HttpCache('cache.db')
+    >>> engine.set_middlewares([cache, check_response_status, ...])
+    '''
+
+    def __init__(self, path, max_size=1024 * 1024 * 1024, default_ttl=0):
+        self.path = path
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, url TEXT, status INTEGER, '
+                         'content_type TEXT, headers TEXT, content BLOB, '
+                         'expires REAL, size INTEGER, access REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS cache_access '
+                         'ON cache (access)')
+        self._db.commit()
+        self._size, = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()
+
+    def _get(self, key):
+        row = self._db.execute(
+            'SELECT url, status, content_type, headers, content, expires '
+            'FROM cache WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            return None
+
+        self._db.execute('UPDATE cache SET access = ? WHERE key = ?',
+                         (time(), key))
+        self._db.commit()
+        return row
+
+    def _put(self, key, rsp, expires):
+        content = rsp.content
+        size = len(content)
+        if size > self.max_size:
+            return
+
+        old = self._db.execute('SELECT size FROM cache WHERE key = ?',
+                               (key, )).fetchone()
+        if old:
+            self._size -= old[0]
+
+        self._db.execute(
+            'REPLACE INTO cache (key, url, status, content_type, headers, '
+            'content, expires, size, access) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, rsp.url, rsp.status, rsp.content_type,
+             json.dumps(dict(rsp.headers)), content, expires, size, time()))
+        self._size += size
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        while self._size > self.max_size:
+            rows = self._db.execute(
+                'SELECT key, size FROM cache ORDER BY access LIMIT 100'
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                return
+
+            for key, size in rows:
+                self._db.execute('DELETE FROM cache WHERE key = ?', (key, ))
+                self._size -= size
+                if self._size <= self.max_size:
+                    return
+
+    def _make_response(self, req, row, headers=None):
+        url, status, ct, cached_headers, content, _ = row
+        cached_headers = json.loads(cached_headers)
+        if headers:
+            cached_headers.update(headers)
+        rsp = Response(url, content, None, status, ct, cached_headers)
+        rsp.req = req
+        return rsp
+
+    def before_request(self, req):
+        if not isinstance(req, Request) or req.method.lower() != 'get':
+            return
+
+        # the key is taken before the conditional headers are added
+        key = req.get_hash()
+        req.cache_key = key
+        req.from_cache = False
+
+        row = self._get(key)
+        if row is None:
+            return
+
+        if row[5] > time():
+            logger.debug(f'cache hit {req.url}')
+            req.from_cache = True
+            req.cached = self._make_response(req, row)
+            return
+
+        headers = json.loads(row[3])
+        conditional = {}
+        if headers.get('etag'):
+            conditional['If-None-Match'] = headers['etag']
+        if headers.get('last-modified'):
+            conditional['If-Modified-Since'] = headers['last-modified']
+
+        if conditional:
+            req_headers = dict(req.kwargs.get('headers') or {})
+            req_headers.update(conditional)
+            req.kwargs['headers'] = req_headers
+
+    def after_headers(self, rsp):
+        req = rsp.req
+        key = getattr(req, 'cache_key', None)
+        if rsp.status != 304 or key is None:
+            return rsp
+
+        row = self._get(key)
+        if row is None:
+            return rsp
+
+        logger.debug(f'cache revalidated {req.url}')
+        new_rsp = self._make_response(req, row, dict(rsp.headers))
+        new_rsp.headers_processed = True
+        req.from_cache = True
+
+        expires = _get_expires(new_rsp.headers, self.default_ttl)
+        if expires is not None:
+            self._db.execute('UPDATE cache SET expires = ? WHERE key = ?',
+                             (expires, key))
+            self._db.commit()
+        return new_rsp
+
+    def after_request(self, rsp):
+        req = rsp.req
+        key = getattr(req, 'cache_key', None)
+        if key is None or getattr(req, 'from_cache', False):
+            return rsp
+
+        if rsp.status != 200 or rsp.content is None:
+            return rsp
+
+        expires = _get_expires(rsp.headers, self.default_ttl)
+        if expires is not None:
+            self._put(key, rsp, expires)
+        return rsp
+
+    def close(self):
+        self._db.close()
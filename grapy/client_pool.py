@@ -0,0 +1,68 @@
+import httpx
+import logging
+
+__all__ = ['ClientPool']
+
+logger = logging.getLogger(__name__)
+
+
+class ClientPool(object):
+    '''
+    A pool of shared httpx.AsyncClient, keyed by (proxy, transport, timeout).
+
+    Requests borrow a client from the pool instead of opening a new one, so
+    the connections are kept alive and reused across requests.
+
+    >>> pool = ClientPool(max_connections=100, keepalive_expiry=30)
+    >>> engine.set_client_pool(pool)
+    >>> ...
+    >>> await pool.close()
+    '''
+
+    def __init__(self,
+                 max_connections=100,
+                 max_keepalive_connections=20,
+                 keepalive_expiry=5.0,
+                 http2=False):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry)
+        self.http2 = http2
+        self.clients = {}
+
+    def _make_key(self, proxy, transport, timeout):
+        if isinstance(proxy, dict):
+            proxy = tuple(sorted(proxy.items()))
+        return (proxy, transport, timeout)
+
+    def get_client(self, proxy=None, transport=None, timeout=60):
+        '''
+        get or create the client for (proxy, transport, timeout)
+        '''
+        key = self._make_key(proxy, transport, timeout)
+        client = self.clients.get(key)
+        if client is None or client.is_closed:
+            logger.debug(f'create client proxy={proxy} timeout={timeout}')
+            client = httpx.AsyncClient(transport=transport,
+                                       timeout=timeout,
+                                       proxies=proxy,
+                                       limits=self.limits,
+                                       http2=self.http2)
+            self.clients[key] = client
+        return client
+
+    async def close(self):
+        '''
+        close all the clients
+        '''
+        clients = list(self.clients.values())
+        self.clients = {}
+        for client in clients:
+            await client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -1,11 +1,15 @@
 from .engine import Engine
 from .base_spider import BaseSpider
 from .base_sched import BaseScheduler
-from .base_request import BaseRequest
+from .base_request import BaseRequest, dump_request, load_request
 from .exceptions import DropItem, IgnoreRequest
 from .item import Item, load_item
+from .metrics import Metrics
+from .trace import Tracer
+from .profiler import CallbackProfiler
 
 __all__ = [
     'Engine', 'BaseSpider', 'BaseScheduler', 'BaseRequest', 'DropItem',
-    'IgnoreRequest', 'Item', 'load_item'
+    'IgnoreRequest', 'Item', 'load_item', 'dump_request', 'load_request',
+    'Metrics', 'Tracer', 'CallbackProfiler'
 ]
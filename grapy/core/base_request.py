@@ -2,8 +2,10 @@ import json
 import re
 import hashlib
 import base64
+from ..utils import import_object
+from . import codec
 
-__all__ = ['BaseRequest']
+__all__ = ['BaseRequest', 'dump_request', 'load_request']
 
 
 class BaseRequest(object):
@@ -11,18 +13,23 @@ class BaseRequest(object):
 
     _keys = [
         'url', 'method', 'callback', 'callback_args', 'kwargs', 'spider',
-        'req_id', 'group', 'sync', 'timeout', 'hash'
+        'req_id', 'group', 'sync', 'timeout', 'hash', 'retry'
     ]
     _default = [{}, (), 'get', None, [], 'default']
 
     _json_keys = ['callback_args', 'kwargs']
 
+    _int_keys = ['retry']
+
+    # the keys of get_hash, the retry count is not a part of the identity
+    _hash_keys = _keys[:-1]
+
     _null_char = '\x01'
 
     __slots__ = [
         'url', 'method', 'callback', 'callback_args', 'kwargs', 'spider',
         'unique', 'req_id', 'group', 'engine', 'request_time', 'sync',
-        'timeout', 'hash'
+        'timeout', 'hash', 'retry'
     ]
 
     def __init__(self,
@@ -49,11 +56,27 @@ class BaseRequest(object):
         self.sync = sync
         self.timeout = timeout
         self.hash = hash
+        self.retry = 0
 
     def pack(self):
         '''
-        pack the Request object on bytes
+        pack the Request object on bytes, the values are typed by codec,
+        the keys are packed by the index of _keys, the default values are
+        skipped
         '''
+        defaults = _get_defaults(self.__class__)
+        fields = []
+        for idx, key in enumerate(self._keys):
+            val = getattr(self, key, None)
+            if val is None:
+                continue
+            default = defaults[idx]
+            if val == default and type(val) is type(default):
+                continue
+            fields.append((idx, val))
+        return codec.encode(fields)
+
+    def _pack_keys(self, keys):
 
         def _pack(key):
             val = getattr(self, key, '')
@@ -66,11 +89,12 @@ class BaseRequest(object):
                 val = str(val)
             return val
 
-        return self._null_char.join(map(_pack, self._keys))
+        return self._null_char.join(map(_pack, keys))
 
     def unpack(self, payload):
         '''
-        unpack the Request payload
+        unpack the legacy Request payload, the values are joined by
+        _null_char
         '''
         if isinstance(payload, bytes):
             payload = str(payload, 'utf-8')
@@ -81,17 +105,28 @@ class BaseRequest(object):
             if payload[json_key]:
                 payload[json_key] = json.loads(payload[json_key])
 
+        for int_key in self._int_keys:
+            if payload.get(int_key):
+                payload[int_key] = int(payload[int_key])
+
         return payload
 
     def __bytes__(self):
-        return bytes(self.pack(), 'utf-8')
+        return self.pack()
 
     @classmethod
     def build(cls, payload):
         '''
-        build a Request
+        build a Request, from the codec or the legacy payload
         '''
         req = cls('')
+        if not isinstance(payload, str) and codec.is_encoded(payload):
+            keys = cls._keys
+            for idx, val in codec.decode(payload):
+                if idx < len(keys):
+                    setattr(req, keys[idx], val)
+            return req
+
         payload = req.unpack(payload)
         for key, val in payload.items():
             if val:
@@ -111,7 +146,39 @@ class BaseRequest(object):
     def get_hash(self):
         if not self.hash:
             h = hashlib.sha256()
-            h.update(bytes(self))
+            h.update(bytes(self._pack_keys(self._hash_keys), 'utf-8'))
             self.hash = str(base64.urlsafe_b64encode((h.digest())), 'UTF-8')
 
         return self.hash
+
+
+_defaults = {}
+
+
+def _get_defaults(cls):
+    '''the values of _keys of a new request, they are not packed'''
+    defaults = _defaults.get(cls)
+    if defaults is None:
+        req = cls('')
+        defaults = [getattr(req, key, None) for key in cls._keys]
+        _defaults[cls] = defaults
+    return defaults
+
+
+def dump_request(req):
+    '''dump the Request with it class name'''
+    cls = req.__class__
+    name = f'{cls.__module__}.{cls.__name__}'
+    return bytes(f'{name}$', 'utf-8') + bytes(req)
+
+
+def load_request(payload):
+    '''load the Request dumped by dump_request'''
+    if isinstance(payload, str):
+        payload = bytes(payload, 'utf-8')
+    idx = payload.find(b'$')
+    name = str(payload[:idx], 'utf-8')
+    cls = import_object(name)
+    if not issubclass(cls, BaseRequest):
+        raise TypeError(f'{name} is not subclass of {__name__}.BaseRequest')
+    return cls.build(payload[idx + 1:])
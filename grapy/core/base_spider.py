@@ -6,6 +6,12 @@ class BaseSpider(object):
 
     name = None
 
+    # the parser of Response.soup, eg: lxml, html5-parser, selectolax
+    parser = None
+
+    # run the sync callbacks on the engine executor if it is set
+    offload = True
+
     def __init__(self, name=None):
         '''
         @name: the spider name, unique
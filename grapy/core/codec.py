@@ -0,0 +1,330 @@
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+__all__ = [
+    'MAGIC', 'VERSION', 'MSGPACK_VERSION', 'USE_MSGPACK', 'encode', 'decode',
+    'is_encoded'
+]
+
+# the prefix of the encoded payloads, the legacy \x01 joined text never
+# starts with it, the version byte follows
+MAGIC = b'\xa7GR'
+VERSION = 1
+# the version of the payloads packed by msgpack
+MSGPACK_VERSION = 2
+
+# pack with msgpack when it is installed, set it False if the payloads are
+# read by the processes without msgpack
+USE_MSGPACK = True
+
+_header = MAGIC + bytes([VERSION])
+_msgpack_header = MAGIC + bytes([MSGPACK_VERSION])
+_header_size = len(_header)
+
+# the msgpack ext code of tuple, msgpack packs tuple as list
+_EXT_TUPLE = 1
+
+_size = struct.Struct('>I')
+_int = struct.Struct('>q')
+_float = struct.Struct('>d')
+
+_INT_MIN = -2**63
+_INT_MAX = 2**63 - 1
+
+
+def _encode_str(buf, val):
+    data = val.encode('utf-8')
+    size = len(data)
+    if size < 256:
+        buf += b'S'
+        buf.append(size)
+    else:
+        buf += b's'
+        buf += _size.pack(size)
+    buf += data
+
+
+def _encode_size(buf, tag, short_tag, size):
+    if size < 256:
+        buf += short_tag
+        buf.append(size)
+    else:
+        buf += tag
+        buf += _size.pack(size)
+
+
+def _encode_bytes(buf, val):
+    _encode_size(buf, b'b', b'y', len(val))
+    buf += val
+
+
+def _encode_int(buf, val):
+    if 0 <= val < 256:
+        buf += b'B'
+        buf.append(val)
+    elif _INT_MIN <= val <= _INT_MAX:
+        buf += b'i'
+        buf += _int.pack(val)
+    else:
+        data = str(val).encode('utf-8')
+        buf += b'n'
+        buf += _size.pack(len(data))
+        buf += data
+
+
+def _encode_float(buf, val):
+    buf += b'd'
+    buf += _float.pack(val)
+
+
+def _encode_bool(buf, val):
+    buf += b'T' if val else b'F'
+
+
+def _encode_none(buf, val):
+    buf += b'N'
+
+
+def _encode_seq(tag, short_tag):
+
+    def encode(buf, val):
+        _encode_size(buf, tag, short_tag, len(val))
+        for v in val:
+            _encode(buf, v)
+
+    return encode
+
+
+def _encode_dict(buf, val):
+    _encode_size(buf, b'm', b'M', len(val))
+    for k, v in val.items():
+        _encode(buf, k)
+        _encode(buf, v)
+
+
+_encoders = {
+    str: _encode_str,
+    bytes: _encode_bytes,
+    int: _encode_int,
+    float: _encode_float,
+    bool: _encode_bool,
+    type(None): _encode_none,
+    list: _encode_seq(b'l', b'L'),
+    tuple: _encode_seq(b'u', b'U'),
+    dict: _encode_dict,
+}
+
+
+def _encode(buf, val):
+    func = _encoders.get(type(val))
+    if func is None:
+        raise TypeError(f'{type(val).__name__} is not serializable')
+    func(buf, val)
+
+
+def _msgpack_default(val):
+    if type(val) is tuple:
+        return msgpack.ExtType(_EXT_TUPLE, _msgpack_pack(list(val)))
+    if type(val) is int:
+        # over 64 bits, encode falls back to struct
+        raise OverflowError(f'{val} is out of range')
+    raise TypeError(f'{type(val).__name__} is not serializable')
+
+
+def _msgpack_ext(code, data):
+    if code == _EXT_TUPLE:
+        return tuple(_msgpack_unpack(data))
+    raise ValueError(f'unknown msgpack ext {code}')
+
+
+def _msgpack_pack(val):
+    return msgpack.packb(val,
+                         use_bin_type=True,
+                         strict_types=True,
+                         default=_msgpack_default)
+
+
+def _msgpack_unpack(data):
+    return msgpack.unpackb(data,
+                           raw=False,
+                           strict_map_key=False,
+                           ext_hook=_msgpack_ext)
+
+
+def encode(fields):
+    '''
+    encode the (index, value) pairs of the fields, the index is under 256,
+    the values are typed. msgpack packs them if it is installed, else (or
+    the ints over 64 bits) struct
+    '''
+    if USE_MSGPACK and msgpack is not None:
+        flat = []
+        for idx, val in fields:
+            flat.append(idx)
+            flat.append(val)
+        try:
+            return _msgpack_header + _msgpack_pack(flat)
+        except OverflowError:
+            pass
+
+    buf = bytearray(_header)
+    for idx, val in fields:
+        buf.append(idx)
+        if type(val) is str:
+            _encode_str(buf, val)
+        else:
+            _encode(buf, val)
+    return bytes(buf)
+
+
+def _decode_short_str(buf, pos):
+    end = pos + 1 + buf[pos]
+    return buf[pos + 1:end].decode('utf-8'), end
+
+
+def _decode_str(buf, pos):
+    end = pos + 4 + _size.unpack_from(buf, pos)[0]
+    return buf[pos + 4:end].decode('utf-8'), end
+
+
+def _decode_bytes(buf, pos):
+    end = pos + 4 + _size.unpack_from(buf, pos)[0]
+    return buf[pos + 4:end], end
+
+
+def _decode_short_bytes(buf, pos):
+    end = pos + 1 + buf[pos]
+    return buf[pos + 1:end], end
+
+
+def _decode_big_int(buf, pos):
+    end = pos + 4 + _size.unpack_from(buf, pos)[0]
+    return int(buf[pos + 4:end]), end
+
+
+def _decode_small_int(buf, pos):
+    return buf[pos], pos + 1
+
+
+def _decode_int(buf, pos):
+    return _int.unpack_from(buf, pos)[0], pos + 8
+
+
+def _decode_float(buf, pos):
+    return _float.unpack_from(buf, pos)[0], pos + 8
+
+
+def _decode_const(val):
+
+    def decode(buf, pos):
+        return val, pos
+
+    return decode
+
+
+def _read_list(buf, pos, size):
+    decoders = _decoders
+    val = []
+    for _ in range(size):
+        v, pos = decoders[buf[pos]](buf, pos + 1)
+        val.append(v)
+    return val, pos
+
+
+def _read_dict(buf, pos, size):
+    decoders = _decoders
+    val = {}
+    for _ in range(size):
+        k, pos = decoders[buf[pos]](buf, pos + 1)
+        val[k], pos = decoders[buf[pos]](buf, pos + 1)
+    return val, pos
+
+
+def _decode_list(buf, pos):
+    return _read_list(buf, pos + 4, _size.unpack_from(buf, pos)[0])
+
+
+def _decode_short_list(buf, pos):
+    return _read_list(buf, pos + 1, buf[pos])
+
+
+def _decode_tuple(buf, pos):
+    val, pos = _decode_list(buf, pos)
+    return tuple(val), pos
+
+
+def _decode_short_tuple(buf, pos):
+    val, pos = _read_list(buf, pos + 1, buf[pos])
+    return tuple(val), pos
+
+
+def _decode_dict(buf, pos):
+    return _read_dict(buf, pos + 4, _size.unpack_from(buf, pos)[0])
+
+
+def _decode_short_dict(buf, pos):
+    return _read_dict(buf, pos + 1, buf[pos])
+
+
+def _unknown_tag(buf, pos):
+    raise ValueError(f'unknown tag {buf[pos - 1]} at {pos - 1}')
+
+
+# the decoders indexed by the tag byte
+_decoders = [_unknown_tag] * 256
+for _tag, _func in [
+    (b'S', _decode_short_str),
+    (b's', _decode_str),
+    (b'b', _decode_bytes),
+    (b'y', _decode_short_bytes),
+    (b'B', _decode_small_int),
+    (b'i', _decode_int),
+    (b'n', _decode_big_int),
+    (b'd', _decode_float),
+    (b'N', _decode_const(None)),
+    (b'T', _decode_const(True)),
+    (b'F', _decode_const(False)),
+    (b'l', _decode_list),
+    (b'L', _decode_short_list),
+    (b'u', _decode_tuple),
+    (b'U', _decode_short_tuple),
+    (b'm', _decode_dict),
+    (b'M', _decode_short_dict),
+]:
+    _decoders[_tag[0]] = _func
+
+
+def is_encoded(payload):
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def decode(payload):
+    '''decode the (index, value) pairs encoded by encode'''
+    if not is_encoded(payload):
+        raise ValueError('payload is not encoded by codec')
+
+    version = payload[len(MAGIC)]
+    if version == MSGPACK_VERSION:
+        if msgpack is None:
+            raise ValueError('msgpack is required to decode the payload, '
+                             'pip install msgpack')
+        flat = _msgpack_unpack(payload[_header_size:])
+        return list(zip(flat[::2], flat[1::2]))
+
+    if version != VERSION:
+        raise ValueError(f'unsupported codec version {version}')
+
+    buf = bytes(payload)
+    size = len(buf)
+    pos = _header_size
+    decoders = _decoders
+    fields = []
+    while pos < size:
+        idx = buf[pos]
+        val, pos = decoders[buf[pos + 1]](buf, pos + 2)
+        fields.append((idx, val))
+    return fields
@@ -2,6 +2,10 @@ import asyncio
 from .base_request import BaseRequest
 from .item import Item
 from .exceptions import EngineError, IgnoreRequest, ItemError, DropItem
+from .exceptions import RetryRequest
+from .executor import pack_response, run_callback, load_results
+from .metrics import Metrics
+from .trace import span, is_tracing
 import logging
 from time import time
 
@@ -9,10 +13,30 @@ __all__ = ['Engine']
 
 logger = logging.getLogger(__name__)
 
+# the requests yielded by a callback are pushed concurrently on batches, so
+# the before_push_request middlewares and the scheduler can coalesce them
+PUSH_BATCH_SIZE = 100
+
+
+def _get_name(obj, hook=None):
+    '''
+    the name of a middleware or a pipeline, the middlewares built by the
+    decorators (eg: after_headers) are named by their functions
+    '''
+    if hook is not None:
+        name = getattr(getattr(obj, hook, None), '__name__', None)
+        if name and name != hook:
+            return name
+    return getattr(obj, '__name__', None) or obj.__class__.__name__
+
 
 class Engine(object):
 
-    __slots__ = ['pipelines', 'spiders', 'middlewares', 'sched', 'event_fun']
+    __slots__ = [
+        'pipelines', 'spiders', 'middlewares', 'sched', 'event_fun',
+        'client_pool', 'executor', 'metrics', 'tracer', 'profiler',
+        '_metrics_task'
+    ]
 
     def __init__(self):
         self.pipelines = []
@@ -20,6 +44,12 @@ class Engine(object):
         self.middlewares = []
         self.sched = None
         self.event_fun = []
+        self.client_pool = None
+        self.executor = None
+        self.metrics = Metrics()
+        self.tracer = None
+        self.profiler = None
+        self._metrics_task = None
 
     def set_spiders(self, spiders):
         self.spiders = {}
@@ -59,6 +89,27 @@ class Engine(object):
         self.sched = sched
         self.sched.engine = self
 
+    def set_client_pool(self, pool):
+        self.client_pool = pool
+
+    def set_executor(self, executor):
+        '''
+        run the sync spider callbacks on the executor, eg: a
+        ProcessPoolExecutor, the spider must be picklable
+        '''
+        self.executor = executor
+
+    def set_metrics(self, metrics):
+        self.metrics = metrics
+
+    def set_tracer(self, tracer):
+        '''trace the stages of the sampled requests, see Tracer'''
+        self.tracer = tracer
+
+    def set_profiler(self, profiler):
+        '''profile the sync callbacks, see CallbackProfiler'''
+        self.profiler = profiler
+
     def add_event(self, func):
         self.event_fun.append(func)
 
@@ -70,52 +121,101 @@ class Engine(object):
 
     async def process(self, req):
         start_time = time()
-        err = None
-        events = []
+        metrics = self.metrics
+        if self._metrics_task is None:
+            self.start_metrics()
+        token = None
+        if self.tracer is not None:
+            token = self.tracer.start(req)
         try:
-            await self._process(req, events)
+            with span('process', args={'url': req.url}):
+                await self._process(req)
+        except IgnoreRequest:
+            metrics.incr(req.spider, 'ignored')
+            raise
+        except RetryRequest:
+            metrics.incr(req.spider, 'retry')
+            raise
         except Exception as e:
-            err = e
-
-        events.append(
-            dict(
-                event_name='process',
-                spider=req.spider,
-                spent=time() - start_time,
-                exc=err or 'None',
-            ))
-
-        await self.emit('events', events=events[:])
-
-        if err is not None:
-            raise err
-
-    async def _process(self, req, events=[]):
+            metrics.incr(req.spider, 'process_error')
+            metrics.incr(req.spider, f'process_error.{e.__class__.__name__}')
+            raise
+        finally:
+            metrics.incr(req.spider, 'process')
+            metrics.observe(req.spider, 'process', time() - start_time)
+            if token is not None:
+                self.tracer.finish(token)
+
+    async def emit_metrics(self):
+        '''emit the metrics snapshot to the event functions'''
+        await self.emit('metrics', snapshot=self.metrics.snapshot())
+
+    async def _emit_metrics_loop(self):
+        while True:
+            await asyncio.sleep(self.metrics.interval)
+            try:
+                await self.emit_metrics()
+            except Exception as e:
+                logger.exception(e)
+
+    def start_metrics(self):
+        '''
+        emit the metrics snapshot every interval seconds, it is started by
+        start() or the first request
+        '''
+        if self._metrics_task is None:
+            self._metrics_task = asyncio.ensure_future(
+                self._emit_metrics_loop())
+
+    async def stop_metrics(self):
+        '''stop the metrics timer and emit the last snapshot'''
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+        await self.emit_metrics()
+
+    async def _process(self, req):
         req.engine = self
         req = await self.process_middleware('before_request', req)
+        metrics = self.metrics
 
-        rsp = await req.request()
+        try:
+            with span('request'):
+                rsp = await req.request()
+        finally:
+            # the rejected responses are counted by process_headers
+            metrics.observe(req.spider, 'request', req.request_time)
+            fallbacks = getattr(req, 'fallbacks', 0)
+            if fallbacks:
+                metrics.incr(req.spider, f'fallback.{req.fallback}',
+                             fallbacks)
 
-        events.append(
-            dict(
-                event_name='request',
-                spider=req.spider,
-                spent=req.request_time,
-                status=rsp.status or 600,
-                data_bytes=len(rsp.content),
-            ))
+        metrics.incr(req.spider, 'data_bytes', len(rsp.content or b''))
 
         rsp.req = req
 
         try:
+            if not rsp.headers_processed:
+                new_rsp = await self.process_headers(rsp)
+                if new_rsp is not rsp:
+                    # the replaced response is closed, eg: the page of a
+                    # PlaywrightRequest
+                    r = rsp.close()
+                    rsp = new_rsp
+                    if asyncio.iscoroutine(r):
+                        await r
             rsp = await self.process_middleware('after_request', rsp)
-            await self.process_response(rsp, events)
+            with span('callback'):
+                await self.process_response(rsp)
         finally:
             r = rsp.close()
             if asyncio.iscoroutine(r):
                 await r
 
     async def process_middleware(self, name, obj):
+        if is_tracing():
+            return await self._trace_middleware(name, obj)
+
         for mid in self.middlewares:
             if hasattr(mid, name):
                 func = getattr(mid, name)
@@ -128,34 +228,81 @@ class Engine(object):
 
         return obj
 
+    async def _trace_middleware(self, name, obj):
+        with span(name):
+            for mid in self.middlewares:
+                if hasattr(mid, name):
+                    func = getattr(mid, name)
+                    with span(_get_name(mid, name), 'middleware'):
+                        new_obj = func(obj)
+                        if asyncio.iscoroutine(new_obj):
+                            new_obj = await new_obj
+
+                    if new_obj is not None:
+                        obj = new_obj
+
+        return obj
+
+    async def process_headers(self, rsp):
+        '''
+        run the after_headers middlewares, before the body is read
+        '''
+        rsp.headers_processed = True
+        spider = rsp.req.spider
+        self.metrics.incr(spider, 'request')
+        self.metrics.incr(spider, f'status.{rsp.status or 600}')
+        return await self.process_middleware('after_headers', rsp)
+
     async def process_item(self, item, pipelines=None):
         if not pipelines:
             pipelines = self.pipelines
 
         for pip in pipelines:
-            new_item = None
-            if hasattr(pip, 'process'):
-                new_item = pip.process(item)
-            elif str(type(pip)) == "<class 'function'>":
-                new_item = pip(item)
-
-            if asyncio.iscoroutine(new_item):
-                new_item = await new_item
+            with span(_get_name(pip), 'pipeline'):
+                new_item = None
+                if hasattr(pip, 'process'):
+                    new_item = pip.process(item)
+                elif str(type(pip)) == "<class 'function'>":
+                    new_item = pip(item)
+
+                if asyncio.iscoroutine(new_item):
+                    new_item = await new_item
             if new_item is not None:
                 item = new_item
 
-    async def process_response(self, rsp, events=[]):
+    async def process_response(self, rsp):
         spider_name = rsp.req.spider
         callback = rsp.req.callback
         args = list(rsp.req.callback_args)
         spider = self.get_spider(spider_name)
         func = getattr(spider, callback)
+        metrics = self.metrics
 
-        async def process_response_item(item):
-            if len(events) > 100:
-                await self.emit('events', events=events[:])
-                events.clear()
+        reqs = []
+        new_items = []
+
+        async def push_reqs():
+            if not reqs:
+                return
+
+            batch = reqs[:]
+            reqs.clear()
+            with span('push_req', args={'count': len(batch)}):
+                await asyncio.gather(*[self.push_req(req) for req in batch])
+            metrics.incr(spider.name, 'push_req', len(batch))
+
+        async def push_items():
+            if not new_items:
+                return
+
+            batch = new_items[:]
+            new_items.clear()
+            with span('push_item', args={'count': len(batch)}):
+                await asyncio.gather(
+                    *[self.push_item(item) for item in batch])
+            metrics.incr(spider.name, 'push_item', len(batch))
 
+        async def process_response_item(item):
             if isinstance(item, BaseRequest):
                 if item.spider is None:
                     item.spider = spider.name
@@ -163,36 +310,46 @@ class Engine(object):
                 item.group = rsp.req.group
                 item.ref = rsp.url
 
-                await self.push_req(item)
-                events.append(
-                    dict(
-                        event_name='push_req',
-                        spider=spider.name,
-                        count=1,
-                    ))
+                reqs.append(item)
+                if len(reqs) >= PUSH_BATCH_SIZE:
+                    await push_reqs()
             elif isinstance(item, Item):
-                await self.push_item(item)
-                events.append(
-                    dict(
-                        event_name='push_item',
-                        spider=spider.name,
-                        count=1,
-                    ))
+                new_items.append(item)
+                if len(new_items) >= PUSH_BATCH_SIZE:
+                    await push_items()
             elif isinstance(item, list):
                 for sub in item:
                     await process_response_item(sub)
             else:
                 raise EngineError('Unknow type')
 
-        if asyncio.iscoroutinefunction(func):
-            async for item in func(rsp, *args):
-                await process_response_item(item)
-        else:
-            items = func(rsp, *args)
-            if items is None:
-                return
-            for item in items:
-                await process_response_item(item)
+        try:
+            if asyncio.iscoroutinefunction(func):
+                async for item in func(rsp, *args):
+                    await process_response_item(item)
+            elif self.executor is not None and getattr(spider, 'offload',
+                                                       True):
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self.executor,
+                                                     run_callback, spider,
+                                                     callback,
+                                                     pack_response(rsp), args)
+                for item in load_results(results):
+                    await process_response_item(item)
+            else:
+                profiler = self.profiler
+                if profiler is not None and profiler.sample(rsp):
+                    items = profiler.run(spider.name, callback, func, rsp,
+                                         *args)
+                else:
+                    items = func(rsp, *args)
+                if items is None:
+                    return
+                for item in items:
+                    await process_response_item(item)
+        finally:
+            await push_reqs()
+            await push_items()
 
     async def push_req(self, req):
         try:
@@ -223,8 +380,17 @@ class Engine(object):
             if asyncio.iscoroutine(reqs):
                 reqs = await reqs
 
+            # pushed concurrently, eg: the batched PeriodicScheduler pushes
+            batch = []
             for req in reqs:
-                await push_req(req, spider)
+                batch.append(push_req(req, spider))
+                if len(batch) >= PUSH_BATCH_SIZE:
+                    await asyncio.gather(*batch)
+                    batch = []
+
+            if batch:
+                await asyncio.gather(*batch)
 
     async def start(self):
+        self.start_metrics()
         await self.start_request()
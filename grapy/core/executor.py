@@ -0,0 +1,60 @@
+from .base_request import BaseRequest, dump_request, load_request
+from .item import Item, load_item
+from .exceptions import EngineError
+
+__all__ = ['pack_response', 'unpack_response', 'run_callback', 'load_results']
+
+
+def pack_response(rsp):
+    '''pack the Response to a picklable tuple'''
+    return (rsp.url, rsp.content, rsp.status, rsp.content_type,
+            dict(rsp.headers), rsp.encoding, rsp._get_parser(),
+            dump_request(rsp.req))
+
+
+def unpack_response(payload):
+    '''rebuild the Response packed by pack_response'''
+    from ..response import Response
+
+    url, content, status, ct, headers, encoding, parser, req = payload
+    rsp = Response(url, content, None, status, ct, headers)
+    rsp.encoding = encoding
+    rsp.parser = parser
+    rsp.headers_processed = True
+    rsp.req = load_request(req)
+    return rsp
+
+
+def _dump_results(items, results):
+    for item in items:
+        if isinstance(item, BaseRequest):
+            results.append(('req', dump_request(item)))
+        elif isinstance(item, Item):
+            results.append(('item', bytes(item)))
+        elif isinstance(item, list):
+            _dump_results(item, results)
+        else:
+            raise EngineError('Unknow type')
+
+
+def run_callback(spider, callback, payload, args):
+    '''
+    run the sync spider callback on the process pool worker, the yielded
+    requests and items are returned on the dumped format
+    '''
+    rsp = unpack_response(payload)
+    func = getattr(spider, callback)
+    items = func(rsp, *args)
+    results = []
+    if items is not None:
+        _dump_results(items, results)
+    return results
+
+
+def load_results(results):
+    '''load the requests and items returned by run_callback'''
+    for kind, payload in results:
+        if kind == 'req':
+            yield load_request(payload)
+        else:
+            yield load_item(payload)
@@ -0,0 +1,142 @@
+from time import time
+
+__all__ = ['Histogram', 'Metrics']
+
+# every power of two range is split to 2**SUB_BITS buckets, the relative
+# error of the percentiles is under 1 / 2**SUB_BITS
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+# the values are recorded on microseconds
+UNIT = 1000000
+
+
+def _bucket(value):
+    if value < SUB_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return SUB_COUNT + shift * SUB_COUNT + (value >> shift) - SUB_COUNT
+
+
+def _bucket_value(idx):
+    '''the middle value of the bucket'''
+    if idx < SUB_COUNT:
+        return idx
+    shift, sub = divmod(idx - SUB_COUNT, SUB_COUNT)
+    low = (sub + SUB_COUNT) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class Histogram(object):
+    '''
+    A log-linear bucketed histogram of the latencies, the buckets are
+    counted in place, the memory is bounded by the value range.
+    '''
+
+    __slots__ = ['buckets', 'count', 'sum', 'min', 'max']
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        value = max(int(seconds * UNIT), 0)
+        idx = _bucket(value)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        '''the p (0 - 1) percentile on seconds'''
+        if self.count == 0:
+            return 0
+
+        rank = p * self.count
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                value = min(max(_bucket_value(idx), self.min), self.max)
+                return value / UNIT
+        return self.max / UNIT
+
+    def snapshot(self):
+        if self.count == 0:
+            return dict(count=0, sum=0, min=0, max=0, p50=0, p90=0, p99=0)
+
+        return dict(
+            count=self.count,
+            sum=self.sum / UNIT,
+            min=self.min / UNIT,
+            max=self.max / UNIT,
+            p50=self.percentile(0.5),
+            p90=self.percentile(0.9),
+            p99=self.percentile(0.99),
+        )
+
+
+class Metrics(object):
+    '''
+    The counters and the latency histograms of the engine by spider and
+    event name, the engine emits a metrics snapshot every interval seconds,
+    and the last one when the scheduler is joined.
+
+    >>> def on_metrics(name, snapshot=None):
+    >>>     if name == 'metrics':
+    >>>         print(snapshot['counters'])
+    >>>
+    >>> engine.add_event(on_metrics)
+    '''
+
+    def __init__(self, interval=10):
+        self.interval = interval
+        self.counters = {}
+        self.histograms = {}
+        self._last_emit = time()
+
+    def incr(self, spider, name, count=1):
+        counters = self.counters.get(spider)
+        if counters is None:
+            counters = self.counters[spider] = {}
+        counters[name] = counters.get(name, 0) + count
+
+    def observe(self, spider, name, seconds):
+        histograms = self.histograms.get(spider)
+        if histograms is None:
+            histograms = self.histograms[spider] = {}
+        hist = histograms.get(name)
+        if hist is None:
+            hist = histograms[name] = Histogram()
+        hist.record(seconds)
+
+    def get(self, spider, name):
+        return self.counters.get(spider, {}).get(name, 0)
+
+    def snapshot(self):
+        '''the aggregated counters and histograms'''
+        self._last_emit = time()
+        return dict(
+            time=self._last_emit,
+            counters={
+                spider: dict(counters)
+                for spider, counters in self.counters.items()
+            },
+            histograms={
+                spider: {
+                    name: hist.snapshot()
+                    for name, hist in histograms.items()
+                }
+                for spider, histograms in self.histograms.items()
+            },
+        )
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
@@ -0,0 +1,109 @@
+from time import time
+import cProfile
+import logging
+import pstats
+import random
+import re
+import os
+
+__all__ = ['CallbackProfiler']
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackProfiler(object):
+    '''
+    Profile the sync spider callbacks of the sampled responses with
+    cProfile, the profiler is enabled only when the callback runs: the call
+    and every step of the iteration of the yielded requests and items, so
+    the other tasks of the event loop are not counted.
+
+    The profiles are aggregated by spider and callback, and dumped to
+    path/<spider>.<callback>.prof every interval seconds, read them with
+    pstats or snakeviz. The async callbacks and the callbacks on the
+    executor are not profiled.
+
+    @path: the directory of the profiles
+    @sample_rate: the ratio of the profiled responses
+    @interval: the dump interval
+
+    >>> engine.set_profiler(CallbackProfiler('profiles', sample_rate=0.05))
+    '''
+
+    def __init__(self, path, sample_rate=0.01, interval=60):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.stats = {}
+        self.samples = {}
+        self._last_dump = time()
+        os.makedirs(path, exist_ok=True)
+
+    def sample(self, rsp):
+        return random.random() < self.sample_rate
+
+    def run(self, spider, callback, func, *args):
+        '''run the callback under the profiler'''
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            items = func(*args)
+        except BaseException:
+            profile.disable()
+            self._add(spider, callback, profile)
+            raise
+
+        profile.disable()
+        if items is None:
+            self._add(spider, callback, profile)
+            return None
+
+        return self._iter(spider, callback, profile, items)
+
+    def _iter(self, spider, callback, profile, items):
+        try:
+            items = iter(items)
+            while True:
+                profile.enable()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    profile.disable()
+
+                yield item
+        finally:
+            self._add(spider, callback, profile)
+
+    def _add(self, spider, callback, profile):
+        key = (spider, callback)
+        profile.create_stats()
+        if not profile.stats:
+            return
+
+        stats = self.stats.get(key)
+        if stats is None:
+            self.stats[key] = pstats.Stats(profile)
+        else:
+            stats.add(profile)
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+        if time() - self._last_dump >= self.interval:
+            self.dump()
+
+    def get_file(self, spider, callback):
+        name = re.sub(r'[^\w.-]', '_', f'{spider}.{callback}')
+        return os.path.join(self.path, f'{name}.prof')
+
+    def dump(self):
+        '''write the aggregated profiles'''
+        self._last_dump = time()
+        for (spider, callback), stats in self.stats.items():
+            try:
+                stats.dump_stats(self.get_file(spider, callback))
+            except Exception as e:
+                logger.exception(e)
+
+    def close(self):
+        self.dump()
@@ -0,0 +1,149 @@
+from contextvars import ContextVar
+from contextlib import nullcontext
+from time import perf_counter
+import itertools
+import random
+import json
+import os
+
+__all__ = ['Tracer', 'span', 'is_tracing']
+
+# the trace of the current request, None when it is not sampled
+_current = ContextVar('trace', default=None)
+
+_null_span = nullcontext()
+
+
+class _Trace(object):
+    __slots__ = ['tracer', 'tid']
+
+    def __init__(self, tracer, tid):
+        self.tracer = tracer
+        self.tid = tid
+
+
+class _Span(object):
+    __slots__ = ['trace', 'name', 'cat', 'args', 'start']
+
+    def __init__(self, trace, name, cat, args):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        args = self.args
+        if exc_type is not None:
+            args = dict(args or {}, exc=exc_type.__name__)
+        self.trace.tracer.add_span(self.trace.tid, self.name, self.cat,
+                                   self.start, perf_counter(), args)
+
+
+def is_tracing():
+    '''the current request is sampled'''
+    return _current.get() is not None
+
+
+def span(name, cat='stage', args=None):
+    '''
+    time the block as a span of the current trace, it does nothing when
+    the current request is not sampled
+
+    >>> with span('parse', 'callback'):
+    >>>     ...
+    '''
+    trace = _current.get()
+    if trace is None:
+        return _null_span
+    return _Span(trace, name, cat, args)
+
+
+class Tracer(object):
+    '''
+    Trace the stages of the sampled requests: the middlewares, the network,
+    the callback, the pushes and the pipelines, the spans are written to a
+    Chrome trace JSON file, open it with chrome://tracing or Perfetto.
+
+    Every sampled request is a thread of the trace.
+
+    @path: the trace file
+    @sample_rate: the ratio of the traced requests
+    @flush_size: the buffered spans before they are written
+
+    >>> tracer = Tracer('grapy.trace.json', sample_rate=0.01)
+    >>> engine.set_tracer(tracer)
+    >>> ...
+    >>> tracer.close()
+    '''
+
+    def __init__(self, path, sample_rate=0.01, flush_size=1000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_size = flush_size
+        self._pid = os.getpid()
+        self._ids = itertools.count(1)
+        self._start = perf_counter()
+        self._spans = []
+        self._fp = open(path, 'w')
+        # the json array format, every span is followed by a comma, the
+        # array is closed by close()
+        self._fp.write('[\n')
+
+    def sample(self, req):
+        return random.random() < self.sample_rate
+
+    def start(self, req):
+        '''start the trace of the request, return the token of finish'''
+        trace = None
+        if self.sample(req):
+            trace = _Trace(self, next(self._ids))
+        return _current.set(trace)
+
+    def finish(self, token):
+        _current.reset(token)
+
+    def add_span(self, tid, name, cat, start, end, args=None):
+        event = {
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': (start - self._start) * 1000000,
+            'dur': (end - start) * 1000000,
+            'pid': self._pid,
+            'tid': tid,
+        }
+        if args:
+            event['args'] = args
+        self._spans.append(event)
+        if len(self._spans) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self._fp is None:
+            return
+        for event in self._spans:
+            self._fp.write(json.dumps(event))
+            self._fp.write(',\n')
+        self._spans = []
+        self._fp.flush()
+
+    def close(self):
+        if self._fp is None:
+            return
+        self.flush()
+        meta = {
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': self._pid,
+            'args': {
+                'name': 'grapy'
+            },
+        }
+        self._fp.write(json.dumps(meta))
+        self._fp.write('\n]\n')
+        self._fp.close()
+        self._fp = None
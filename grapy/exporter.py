@@ -0,0 +1,224 @@
+from .middleware import RequestFilter
+from .core.metrics import UNIT
+import asyncio
+import logging
+import os
+
+__all__ = ['MetricsExporter', 'CONTENT_TYPE']
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+QUANTILES = [0.5, 0.9, 0.99]
+
+# the engine counters exported as OpenMetrics counters
+COUNTERS = [
+    ('request', 'grapy_requests', 'The fetched responses'),
+    ('data_bytes', 'grapy_downloaded_bytes', 'The downloaded body bytes'),
+    ('push_req', 'grapy_pushed_requests', 'The requests yielded'),
+    ('push_item', 'grapy_items', 'The items yielded'),
+    ('ignored', 'grapy_ignored', 'The requests ignored by the middlewares'),
+    ('retry', 'grapy_retries', 'The requests retried by the middlewares'),
+    ('process_error', 'grapy_errors', 'The failed requests'),
+]
+
+# the engine histograms exported as OpenMetrics summaries
+SUMMARIES = [
+    ('request', 'grapy_request_seconds', 'The request time'),
+    ('process', 'grapy_process_seconds',
+     'The time of the request, the middlewares and the callback'),
+]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class MetricsExporter(object):
+    '''
+    Export the engine metrics on the OpenMetrics text format, served by a
+    stdlib asyncio HTTP server or dumped to a file every interval seconds.
+
+    It covers the requests, the bytes, the status codes (the responses
+    rejected by the after_headers middlewares too), the ignored and retried
+    requests, the request time percentiles and the items by spider, the
+    queue depth and the running requests of the scheduler, and the dedupe
+    hits of the RequestFilters.
+
+    @engine: the Engine
+    @host, @port: the address of the HTTP server
+    @path: the file to dump
+    @interval: the dump interval
+
+    >>> exporter = MetricsExporter(engine, port=9410)
+    >>> await exporter.start()
+    >>> ...
+    >>> await exporter.close()
+    '''
+
+    def __init__(self,
+                 engine,
+                 host='127.0.0.1',
+                 port=9410,
+                 path=None,
+                 interval=15):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self._server = None
+        self._dumper = None
+
+    def _render_counters(self, lines, counters):
+        for key, name, doc in COUNTERS:
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'# HELP {name} {doc}')
+            for spider, values in counters.items():
+                value = values.get(key, 0)
+                labels = _labels([('spider', spider)])
+                lines.append(f'{name}_total{labels} {value}')
+
+        lines.append('# TYPE grapy_responses counter')
+        lines.append('# HELP grapy_responses The responses by status code')
+        for spider, values in counters.items():
+            for key, value in values.items():
+                if key.startswith('status.'):
+                    labels = _labels([('spider', spider),
+                                      ('code', key[7:])])
+                    lines.append(f'grapy_responses_total{labels} {value}')
+
+        lines.append('# TYPE grapy_fallbacks counter')
+        lines.append('# HELP grapy_fallbacks The fallback requests')
+        for spider, values in counters.items():
+            for key, value in values.items():
+                if key.startswith('fallback.'):
+                    labels = _labels([('spider', spider),
+                                      ('policy', key[9:])])
+                    lines.append(f'grapy_fallbacks_total{labels} {value}')
+
+    def _render_summaries(self, lines, histograms):
+        for key, name, doc in SUMMARIES:
+            lines.append(f'# TYPE {name} summary')
+            lines.append(f'# HELP {name} {doc}')
+            for spider, hists in histograms.items():
+                hist = hists.get(key)
+                if hist is None:
+                    continue
+                for q in QUANTILES:
+                    labels = _labels([('spider', spider), ('quantile', q)])
+                    lines.append(f'{name}{labels} {hist.percentile(q)}')
+                labels = _labels([('spider', spider)])
+                lines.append(f'{name}_count{labels} {hist.count}')
+                lines.append(f'{name}_sum{labels} {hist.sum / UNIT}')
+
+    def _render_sched(self, lines):
+        sched = self.engine.sched
+        gauges = [
+            ('grapy_queue_depth', 'The requests wait on the scheduler',
+             'qsize'),
+            ('grapy_running_requests', 'The running requests', 'running'),
+        ]
+        for name, doc, method in gauges:
+            func = getattr(sched, method, None)
+            if func is None:
+                continue
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'# HELP {name} {doc}')
+            lines.append(f'{name} {func()}')
+
+        size = getattr(sched, 'size', None)
+        if size is not None:
+            lines.append('# TYPE grapy_concurrency gauge')
+            lines.append('# HELP grapy_concurrency The max running requests')
+            lines.append(f'grapy_concurrency {size}')
+
+    def _render_filters(self, lines):
+        filters = [
+            mid for mid in self.engine.middlewares
+            if isinstance(mid, RequestFilter)
+        ]
+        if not filters:
+            return
+
+        checks = sum(f.checks for f in filters)
+        hits = sum(f.hits for f in filters)
+        lines.append('# TYPE grapy_dedupe_checks counter')
+        lines.append('# HELP grapy_dedupe_checks The checked request keys')
+        lines.append(f'grapy_dedupe_checks_total {checks}')
+        lines.append('# TYPE grapy_dedupe_hits counter')
+        lines.append('# HELP grapy_dedupe_hits The duplicate request keys')
+        lines.append(f'grapy_dedupe_hits_total {hits}')
+
+    def render(self):
+        '''the metrics on the OpenMetrics text format'''
+        metrics = self.engine.metrics
+        lines = []
+        self._render_counters(lines, metrics.counters)
+        self._render_summaries(lines, metrics.histograms)
+        self._render_sched(lines)
+        self._render_filters(lines)
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path=None):
+        '''write the metrics to the file, it is replaced atomically'''
+        path = path or self.path
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or line in (b'\r\n', b'\n'):
+                    break
+
+            body = bytes(self.render(), 'utf-8')
+            head = ('HTTP/1.1 200 OK\r\n'
+                    f'Content-Type: {CONTENT_TYPE}\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                    'Connection: close\r\n\r\n')
+            writer.write(bytes(head, 'utf-8') + body)
+            await writer.drain()
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            writer.close()
+
+    async def _dump_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.dump()
+            except Exception as e:
+                logger.exception(e)
+
+    async def start(self):
+        '''start the HTTP server, and the file dumper if path is set'''
+        if self.port is not None:
+            self._server = await asyncio.start_server(self._handle,
+                                                      self.host, self.port)
+        if self.path:
+            self._dumper = asyncio.create_task(self._dump_loop())
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        if self._dumper is not None:
+            self._dumper.cancel()
+            self._dumper = None
+            self.dump()
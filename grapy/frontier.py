@@ -0,0 +1,197 @@
+from .core import dump_request, load_request
+from collections import deque
+from time import time
+import sqlite3
+import struct
+import os
+
+__all__ = ['DiskQueue', 'SqliteQueue']
+
+_header = struct.Struct('>I')
+
+
+class DiskQueue(object):
+    '''
+    A FIFO queue of requests on an append-only file, used by Scheduler to
+    spill the requests over max_pending.
+
+    The popped records are dropped when the queue is empty, or compacted
+    when they are over compact_size bytes and half of the file, so the file
+    follows the backlog instead of all the requests ever spilled.
+
+    @path: the spill file
+    @compact_size: the popped bytes before the file is compacted
+
+    >>> sched = Scheduler(size=10, max_pending=1000,
+    >>>                   spill=DiskQueue('/tmp/spill.log'))
+    '''
+
+    def __init__(self, path, compact_size=64 * 1024 * 1024):
+        self.path = path
+        self.compact_size = compact_size
+        self._fp = open(path, 'w+b')
+        self._read_pos = 0
+        self._write_pos = 0
+        self._size = 0
+
+    def push(self, req):
+        data = dump_request(req)
+        self._fp.seek(self._write_pos)
+        self._fp.write(_header.pack(len(data)) + data)
+        self._write_pos += _header.size + len(data)
+        self._size += 1
+
+    def pop(self):
+        if self._size == 0:
+            return None
+
+        self._fp.seek(self._read_pos)
+        size, = _header.unpack(self._fp.read(_header.size))
+        data = self._fp.read(size)
+        self._read_pos += _header.size + size
+        self._size -= 1
+
+        if self._size == 0:
+            self._fp.seek(0)
+            self._fp.truncate()
+            self._read_pos = 0
+            self._write_pos = 0
+        elif self._read_pos >= self.compact_size and \
+                self._read_pos * 2 >= self._write_pos:
+            self._compact()
+
+        return load_request(data)
+
+    def _compact(self, chunk_size=1024 * 1024):
+        '''move the unread records to the head of the file'''
+        src = self._read_pos
+        dst = 0
+        while src < self._write_pos:
+            self._fp.seek(src)
+            chunk = self._fp.read(min(chunk_size, self._write_pos - src))
+            self._fp.seek(dst)
+            self._fp.write(chunk)
+            src += len(chunk)
+            dst += len(chunk)
+
+        self._fp.truncate(dst)
+        self._read_pos = 0
+        self._write_pos = dst
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        self._fp.close()
+        os.remove(self.path)
+
+
+class SqliteQueue(object):
+    '''
+    A persistent FIFO queue of requests on SQLite, used by FrontierScheduler.
+
+    A request stays in the database until it is done, so the pending and the
+    running requests are resumed after a restart. The writes are batched,
+    they are committed every batch_size changes or checkpoint_interval
+    seconds, a crash loses at most the uncommitted pushes and runs the
+    uncommitted done requests again.
+
+    @path: the database file
+    @batch_size: the batch size of reads and writes
+    @checkpoint_interval: the max seconds between two commits
+    @resume: keep the requests of the last run, otherwise clear them
+    '''
+
+    def __init__(self,
+                 path,
+                 batch_size=100,
+                 checkpoint_interval=1,
+                 resume=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS frontier '
+                         '(id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'payload BLOB NOT NULL)')
+        if not resume:
+            self._db.execute('DELETE FROM frontier')
+        self._db.commit()
+
+        self._writes = []
+        self._deletes = []
+        self._reads = deque()
+        self._ids = {}
+        self._last_id = 0
+        self._last_checkpoint = time()
+        self._size, = self._db.execute(
+            'SELECT COUNT(*) FROM frontier').fetchone()
+
+    def push(self, req):
+        self._writes.append((dump_request(req), ))
+        self._size += 1
+        if len(self._writes) >= self.batch_size:
+            self.checkpoint()
+        else:
+            self._maybe_checkpoint()
+
+    def pop(self):
+        if self._size == 0:
+            return None
+
+        if not self._reads:
+            self._read()
+
+        row_id, payload = self._reads.popleft()
+        self._last_id = row_id
+        self._size -= 1
+        req = load_request(payload)
+        self._ids[id(req)] = row_id
+        return req
+
+    def _read(self):
+        if self._writes:
+            self.checkpoint()
+
+        rows = self._db.execute(
+            'SELECT id, payload FROM frontier WHERE id > ? '
+            'ORDER BY id LIMIT ?', (self._last_id, self.batch_size))
+        self._reads.extend(rows)
+
+    def done(self, req):
+        '''remove the finished request from the frontier'''
+        row_id = self._ids.pop(id(req), None)
+        if row_id is None:
+            return
+
+        self._deletes.append((row_id, ))
+        if len(self._deletes) >= self.batch_size:
+            self.checkpoint()
+        else:
+            self._maybe_checkpoint()
+
+    def _maybe_checkpoint(self):
+        if time() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        '''commit the batched writes'''
+        if self._writes:
+            self._db.executemany('INSERT INTO frontier (payload) VALUES (?)',
+                                 self._writes)
+            self._writes = []
+        if self._deletes:
+            self._db.executemany('DELETE FROM frontier WHERE id = ?',
+                                 self._deletes)
+            self._deletes = []
+        self._db.commit()
+        self._last_checkpoint = time()
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        self.checkpoint()
+        self._db.close()
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from .request import Request
+from .playwright_request import PlaywrightRequest
+import logging
+import re
+
+__all__ = ['HybridRequest', 'DECISION_CACHE_SIZE']
+
+logger = logging.getLogger(__name__)
+
+# the max url patterns remembered to render
+DECISION_CACHE_SIZE = 10000
+
+_decisions = OrderedDict()
+
+re_digits = re.compile(r'\d+')
+
+
+class HybridRequest(Request, PlaywrightRequest):
+    '''
+    Try the plain httpx request first, it escalates to the browser only
+    when the response looks unrendered, the decision is remembered by the
+    host and the url pattern (the digits of the path are ignored), so the
+    later requests of the pattern go to the browser directly.
+
+    The browser is assigned by AssignBrowser or PagePool, the same as
+    PlaywrightRequest, the request never escalates without them.
+
+    >>> class MyRequest(HybridRequest):
+    >>>     render_selector = '#content .item'
+    >>>     block_resources = ['image', 'font', 'media']
+    '''
+
+    # render the response of these status codes, eg: the js challenge
+    render_status = [403, 503]
+
+    # render when the body is smaller than min_size bytes
+    min_size = 512
+
+    # render when the body matches the regex
+    challenge = (r'<noscript>[^<]*enable javascript|challenge-platform'
+                 r'|cf-browser-verification|just a moment\.\.\.')
+
+    # render when the selector matches nothing, None skip the check
+    render_selector = None
+
+    def get_pattern(self):
+        url = urlsplit(self.url)
+        return (url.netloc.lower(), re_digits.sub('0', url.path))
+
+    def can_render(self):
+        return getattr(self, 'page_pool', None) is not None or \
+            getattr(self, 'browser', None) is not None
+
+    def should_render(self, rsp):
+        '''the detector, return True if the response need the browser'''
+        if rsp.status in self.render_status:
+            return True
+
+        if 'html' not in rsp.content_type.lower():
+            return False
+
+        content = rsp.content or b''
+        if len(content) < self.min_size:
+            return True
+
+        if self.challenge and re.search(bytes(self.challenge, 'utf-8'),
+                                        content, re.I):
+            return True
+
+        if self.render_selector:
+            rsp.req = self
+            if rsp.soup.select_one(self.render_selector) is None:
+                return True
+
+        return False
+
+    async def _read_response(self, rsp, close):
+        # the headers middlewares run once, by the engine on the final
+        # response if this one may escalate to the browser: the status
+        # escalates without the body, the html body is read for the
+        # detector. otherwise they run before the body is read.
+        try:
+            self._check_headers(rsp)
+            response = self._parse_response(rsp)
+            can_render = self.can_render()
+            if can_render and response.status in self.render_status:
+                return response
+
+            html = 'html' in response.content_type.lower()
+            if self.engine is not None and not (can_render and html):
+                response.req = self
+                new_response = await self._process_headers(response)
+                if new_response is not response:
+                    return new_response
+
+            await response.aread()
+            return response
+        finally:
+            await close()
+
+    async def render(self):
+        return await PlaywrightRequest.request(self)
+
+    async def request(self):
+        '''
+        do request
+
+        >>> req = HybridRequest('http://example.com')
+        >>> rsp = await req.request()
+        '''
+        if not self.can_render():
+            return await Request.request(self)
+
+        pattern = self.get_pattern()
+        if pattern in _decisions:
+            _decisions.move_to_end(pattern)
+            return await self.render()
+
+        rsp = await Request.request(self)
+        if not self.should_render(rsp):
+            return rsp
+
+        logger.info(f'render {self.url} on the browser')
+        _decisions[pattern] = True
+        if len(_decisions) > DECISION_CACHE_SIZE:
+            _decisions.popitem(last=False)
+
+        return await self.render()
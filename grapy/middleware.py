@@ -1,11 +1,12 @@
 from .core.exceptions import IgnoreRequest, RetryRequest
-from .utils import after_request
+from .utils import after_headers, Batcher
 import re
-from bloom_filter2 import BloomFilter
+from .bloom import ScalableBloomFilter
 from asyncio import sleep
+from uuid import uuid4
 
 
-@after_request
+@after_headers
 def check_response_status(rsp):
     if rsp.status >= 400 and rsp.status < 500:
         raise IgnoreRequest()
@@ -13,7 +14,7 @@ def check_response_status(rsp):
         raise RetryRequest()
 
 
-@after_request
+@after_headers
 def check_response_content_type(rsp):
     if not re.search('html|json|text|xml|rss|pdf|javascript', rsp.content_type,
                      re.I):
@@ -24,12 +25,22 @@ re_url = re.compile('^https?://[^/]+')
 
 
 class RequestFilter():
+    '''
+    Drop the duplicate requests.
+
+    @filter: the set of seen keys, default is an in-memory
+             ScalableBloomFilter, use ScalableBloomFilter(path=...) to
+             keep it over restarts
+    '''
 
     def __init__(self, filter=None):
         if filter is None:
-            filter = BloomFilter(max_elements=10000, error_rate=0.1)
+            filter = ScalableBloomFilter()
 
         self.filter = filter
+        # the count of the checked keys and the duplicate ones
+        self.checks = 0
+        self.hits = 0
 
     def before_push_request(self, req):
         if not re_url.match(req.url):
@@ -39,31 +50,45 @@ class RequestFilter():
             return
 
         key = req.get_hash()
+        self.checks += 1
         if key in self.filter:
+            self.hits += 1
             raise IgnoreRequest()
 
         self.filter.add(key)
 
 
 class PeriodicRequestFilter(RequestFilter):
+    '''
+    A RequestFilter shared by the periodic workers, the keys checked in a
+    short window are sent on one bloom_filter_batch job.
+    '''
 
     async def before_push_request(self, req):
         if not req.unique:
             return
         key = req.get_hash()
 
+        exists = await self._batcher.submit(key)
+        self.checks += 1
+        if exists:
+            self.hits += 1
+            raise IgnoreRequest()
+
+    async def check_keys(self, keys):
+        workload = '\n'.join(keys)
         for retry_count in range(self._retry_count):
             await sleep(retry_count * 0.01)
-            exists = b'True'
             try:
-                exists = await self._worker.run_job('bloom_filter', key)
+                ret = await self._worker.run_job('bloom_filter_batch',
+                                                 uuid4().hex, workload)
             except Exception:
                 continue
 
-            if exists == b'True':
-                raise IgnoreRequest()
-            if exists == b'False':
-                break
+            if isinstance(ret, bytes) and len(ret) == len(keys):
+                return [flag == ord('1') for flag in ret]
+
+        return [False] * len(keys)
 
     async def bloom_filter(self, job):
         exists = job.name in self.filter
@@ -71,11 +96,32 @@ class PeriodicRequestFilter(RequestFilter):
 
         await job.done(str(exists))
 
-    async def init(self, worker, retry_count=10, filter=True):
+    async def bloom_filter_batch(self, job):
+        workload = job.workload
+        if isinstance(workload, bytes):
+            workload = str(workload, 'utf-8')
+
+        ret = []
+        for key in workload.split('\n'):
+            exists = key in self.filter
+            self.filter.add(key)
+            ret.append('1' if exists else '0')
+
+        await job.done(''.join(ret))
+
+    async def init(self,
+                   worker,
+                   retry_count=10,
+                   filter=True,
+                   batch_size=100,
+                   batch_interval=0.01):
         self._worker = worker
         self._retry_count = retry_count
+        self._batcher = Batcher(self.check_keys, batch_size, batch_interval)
         if filter:
             await self._worker.add_func('bloom_filter', self.bloom_filter)
+            await self._worker.add_func('bloom_filter_batch',
+                                        self.bloom_filter_batch)
 
 
 class AssignHeaderByText():
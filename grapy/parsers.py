@@ -0,0 +1,125 @@
+from bs4 import BeautifulSoup
+
+try:
+    import html5_parser
+except Exception:
+    html5_parser = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except Exception:
+    LexborHTMLParser = None
+
+__all__ = [
+    'register_parser', 'get_parser', 'make_soup', 'SelectolaxNode',
+    'DEFAULT_PARSER'
+]
+
+DEFAULT_PARSER = 'html.parser'
+
+_parsers = {}
+
+
+def register_parser(name, func):
+    '''
+    register a parser backend, func(text) returns an object with the
+    select and select_one methods
+    '''
+    _parsers[name] = func
+
+
+def get_parser(name):
+    func = _parsers.get(name)
+    if func is None:
+        raise Exception(f'parser {name} is not registered')
+    return func
+
+
+def make_soup(text, parser=None):
+    '''parse the text with the parser backend'''
+    return get_parser(parser or DEFAULT_PARSER)(text)
+
+
+def _bs4_parser(features):
+
+    def parse(text):
+        return BeautifulSoup(text, features)
+
+    return parse
+
+
+def _html5_parser(text):
+    if html5_parser is None:
+        raise Exception('''html5-parser is required.
+                        install:
+                            pip install html5-parser''')
+    return html5_parser.parse(text, treebuilder='soup')
+
+
+def _selectolax_parser(text):
+    if LexborHTMLParser is None:
+        raise Exception('''selectolax is required.
+                        install:
+                            pip install selectolax''')
+    return SelectolaxNode(LexborHTMLParser(text))
+
+
+class SelectolaxNode(object):
+    '''
+    An adapter of the selectolax lexbor node, it exposes the often used
+    part of the BeautifulSoup api, so the callbacks work on both.
+    '''
+
+    __slots__ = ['node']
+
+    def __init__(self, node):
+        self.node = node
+
+    def select(self, selector, namespaces=None, limit=None, **kwargs):
+        nodes = self.node.css(selector)
+        if limit:
+            nodes = nodes[:limit]
+        return [SelectolaxNode(node) for node in nodes]
+
+    def select_one(self, selector, namespaces=None, **kwargs):
+        node = self.node.css_first(selector)
+        if node is None:
+            return None
+        return SelectolaxNode(node)
+
+    def find(self, name):
+        return self.select_one(name)
+
+    def find_all(self, name, limit=None):
+        return self.select(name, limit=limit)
+
+    def get_text(self, separator='', strip=False):
+        return self.node.text(separator=separator, strip=strip)
+
+    @property
+    def text(self):
+        return self.get_text()
+
+    @property
+    def name(self):
+        return getattr(self.node, 'tag', None)
+
+    @property
+    def attrs(self):
+        return dict(getattr(self.node, 'attributes', {}))
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def __str__(self):
+        return self.node.html or ''
+
+
+for _name in ['html.parser', 'lxml', 'lxml-xml', 'xml', 'html5lib']:
+    register_parser(_name, _bs4_parser(_name))
+
+register_parser('html5-parser', _html5_parser)
+register_parser('selectolax', _selectolax_parser)
@@ -1,11 +1,15 @@
 from .response import Response
 from .core import BaseRequest
 from time import time
+import asyncio
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
-__all__ = ['PlaywrightRequest', 'PlaywrightRequestError', 'AssignBrowser']
+__all__ = [
+    'PlaywrightRequest', 'PlaywrightRequestError', 'AssignBrowser', 'PagePool'
+]
 
 
 class PlaywrightRequestError(Exception):
@@ -17,19 +21,61 @@ class PlaywrightRequest(BaseRequest):
     the PlaywrightRequest object
     '''
 
+    # the resource types to abort, eg: ['image', 'font', 'stylesheet']
+    block_resources = []
+
+    # the regexes of the urls to abort, eg: ['google-analytics\\.com']
+    block_urls = []
+
+    # when the page is loaded: load, domcontentloaded, networkidle, commit
+    wait_until = 'load'
+
+    # a selector to wait for after the page is loaded
+    wait_selector = None
+
     def set_browser(self, browser):
         self.browser = browser
 
+    def set_page_pool(self, pool):
+        self.page_pool = pool
+
     async def get_page(self):
+        pool = getattr(self, 'page_pool', None)
+        if pool is not None:
+            return await pool.acquire()
+
         browser = getattr(self, 'browser', None)
         if browser is None:
             raise PlaywrightRequestError('browser is not initial')
 
         return await browser.new_page()
 
+    async def release_page(self, page):
+        pool = getattr(self, 'page_pool', None)
+        if pool is not None:
+            return await pool.release(page)
+
+        await page.close()
+
     async def custom_action(self, page):
         pass
 
+    def is_blocked(self, request):
+        if request.resource_type in self.block_resources:
+            return True
+
+        for pattern in self.block_urls:
+            if re.search(pattern, request.url):
+                return True
+
+        return False
+
+    async def route(self, route):
+        if self.is_blocked(route.request):
+            await route.abort()
+        else:
+            await route.continue_()
+
     async def request(self):
         '''
         do request
@@ -55,8 +101,20 @@ class PlaywrightRequest(BaseRequest):
 
         page.on("response", handler)
 
+        blocking = self.block_resources or self.block_urls
+
+        async def close():
+            page.remove_listener("response", handler)
+            if blocking:
+                await page.unroute('**/*', self.route)
+            await self.release_page(page)
+
         try:
-            await page.goto(self.url)
+            if blocking:
+                await page.route('**/*', self.route)
+            await page.goto(self.url, wait_until=self.wait_until)
+            if self.wait_selector:
+                await page.wait_for_selector(self.wait_selector)
             await self.custom_action(page)
             content = await page.content()
             logger.info(f'{method.upper()} {self.url} {status} {ct}')
@@ -66,7 +124,10 @@ class PlaywrightRequest(BaseRequest):
                             status,
                             ct,
                             rsp.headers,
-                            close=page.close)
+                            close=close)
+        except BaseException:
+            await close()
+            raise
         finally:
             self.request_time = time() - start_time
 
@@ -86,3 +147,76 @@ class AssignBrowser():
     def before_request(self, req):
         if isinstance(req, PlaywrightRequest):
             req.set_browser(self.browser)
+
+
+class PagePool():
+    '''
+    Keep a fixed set of warm pages, the pages are reset and reused between
+    the requests, the size caps the concurrently opened pages.
+
+    @browser: the browser or the browser context
+    @size: the max pages
+    @new_context: open every page on it own context, the cookies and the
+                  storage are cleared when the page is reset
+
+    >>> pagePool = PagePool(browser, size=4)
+    >>> engine.set_middlewares([pagePool, ...])
+    >>> ...
+    >>> await pagePool.close()
+    '''
+
+    def __init__(self, browser, size=4, new_context=False):
+        self.browser = browser
+        self.size = size
+        self.new_context = new_context
+        self._pages = []
+        self._sem = asyncio.Semaphore(size)
+
+    def before_request(self, req):
+        if isinstance(req, PlaywrightRequest):
+            req.set_page_pool(self)
+
+    async def _new_page(self):
+        if self.new_context:
+            context = await self.browser.new_context()
+            return await context.new_page()
+        return await self.browser.new_page()
+
+    async def acquire(self):
+        await self._sem.acquire()
+        try:
+            if self._pages:
+                return self._pages.pop()
+            return await self._new_page()
+        except BaseException:
+            self._sem.release()
+            raise
+
+    async def _reset(self, page):
+        await page.goto('about:blank')
+        if self.new_context:
+            await page.context.clear_cookies()
+
+    async def _close_page(self, page):
+        await page.close()
+        if self.new_context:
+            await page.context.close()
+
+    async def release(self, page):
+        try:
+            await self._reset(page)
+            self._pages.append(page)
+        except Exception as e:
+            logger.exception(e)
+            try:
+                await self._close_page(page)
+            except Exception:
+                pass
+        finally:
+            self._sem.release()
+
+    async def close(self):
+        pages = self._pages
+        self._pages = []
+        for page in pages:
+            await self._close_page(page)
@@ -0,0 +1,190 @@
+from .request import Request
+import threading
+import hashlib
+import logging
+import struct
+import json
+import mmap
+import os
+import httpx
+
+__all__ = ['RecordTransport', 'ReplayTransport', 'AssignTransport']
+
+logger = logging.getLogger(__name__)
+
+# the record frame: the length of the meta json and the length of the body
+_frame = struct.Struct('>II')
+
+
+def get_key(request):
+    '''the archive key of the httpx request'''
+    key = f'{request.method.upper()} {request.url}'
+    content = getattr(request, '_content', None)
+    if content:
+        key += ' ' + hashlib.sha1(content).hexdigest()
+    return key
+
+
+class RecordTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    '''
+    Do the requests on the real transport and append the responses (status,
+    headers and the raw body) to an archive for ReplayTransport.
+
+    The archive is a log of records, every record is a frame header, the
+    meta json and the body.
+
+    @path: the archive file, the records are appended if exists
+    @transport: the real transport, default is the httpx transport
+    '''
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport
+        self._fp = open(path, 'ab')
+        self._lock = threading.Lock()
+        self._async_transport = None
+        self._sync_transport = None
+
+    def _write(self, request, response, body):
+        meta = json.dumps({
+            'key': get_key(request),
+            'status': response.status_code,
+            'headers': response.headers.multi_items(),
+        })
+        meta = bytes(meta, 'utf-8')
+        with self._lock:
+            self._fp.write(_frame.pack(len(meta), len(body)))
+            self._fp.write(meta)
+            self._fp.write(body)
+            self._fp.flush()
+
+    def _get_async_transport(self):
+        if self._async_transport is None:
+            transport = self.transport
+            if not hasattr(transport, 'handle_async_request'):
+                transport = httpx.AsyncHTTPTransport()
+            self._async_transport = transport
+        return self._async_transport
+
+    def _get_sync_transport(self):
+        if self._sync_transport is None:
+            transport = self.transport
+            if not hasattr(transport, 'handle_request'):
+                transport = httpx.HTTPTransport()
+            self._sync_transport = transport
+        return self._sync_transport
+
+    async def handle_async_request(self, request):
+        transport = self._get_async_transport()
+        response = await transport.handle_async_request(request)
+        try:
+            body = b''.join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+
+        self._write(request, response, body)
+        return httpx.Response(response.status_code,
+                              headers=response.headers,
+                              content=body)
+
+    def handle_request(self, request):
+        transport = self._get_sync_transport()
+        response = transport.handle_request(request)
+        try:
+            body = b''.join(response.stream)
+        finally:
+            response.close()
+
+        self._write(request, response, body)
+        return httpx.Response(response.status_code,
+                              headers=response.headers,
+                              content=body)
+
+    def close_archive(self):
+        '''
+        close the archive file, the clients close the transport on exit,
+        so the archive is closed explicitly
+        '''
+        with self._lock:
+            if not self._fp.closed:
+                self._fp.close()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    '''
+    Serve the responses recorded by RecordTransport without the network,
+    the archive is memory mapped and indexed by the method, the url and
+    the body of the request, the last record of a key wins.
+
+    @path: the archive file
+    @missing_status: the status code of the requests not recorded
+    '''
+
+    def __init__(self, path, missing_status=404):
+        self.path = path
+        self.missing_status = missing_status
+        self._index = {}
+        self._fp = open(path, 'rb')
+        self._buf = b''
+        if os.path.getsize(path) > 0:
+            self._buf = mmap.mmap(self._fp.fileno(),
+                                  0,
+                                  access=mmap.ACCESS_READ)
+        self._load()
+
+    def _load(self):
+        buf = self._buf
+        size = len(buf)
+        offset = 0
+        while offset + _frame.size <= size:
+            meta_size, body_size = _frame.unpack_from(buf, offset)
+            start = offset + _frame.size
+            end = start + meta_size + body_size
+            if end > size:
+                logger.error(f'{self.path} is truncated at {offset}')
+                break
+            meta = json.loads(buf[start:start + meta_size])
+            self._index[meta['key']] = (meta, start + meta_size, end)
+            offset = end
+
+    def __len__(self):
+        return len(self._index)
+
+    def _get_response(self, request):
+        record = self._index.get(get_key(request))
+        if record is None:
+            return httpx.Response(self.missing_status)
+
+        meta, start, end = record
+        return httpx.Response(meta['status'],
+                              headers=meta['headers'],
+                              content=self._buf[start:end])
+
+    async def handle_async_request(self, request):
+        return self._get_response(request)
+
+    def handle_request(self, request):
+        return self._get_response(request)
+
+    def close_archive(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._fp.close()
+
+
+class AssignTransport(object):
+    '''
+    Assign the transport to the Requests, eg: RecordTransport or
+    ReplayTransport
+
+    >>> engine.set_middlewares([AssignTransport(ReplayTransport('crawl.rec')),
+    >>>                         ...])
+    '''
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def before_request(self, req):
+        if isinstance(req, Request):
+            req.transport = self.transport
+        return req
@@ -2,33 +2,94 @@ import httpx
 from urllib.parse import urljoin
 from .response import Response
 from .core import BaseRequest
+from .core.exceptions import IgnoreRequest, RetryRequest
 from time import time
 import logging
 import anyio
+import re
 
-__all__ = ['Request']
+__all__ = ['Request', 'set_fallback_threads']
 
 logger = logging.getLogger(__name__)
 
+FALLBACK_THREADS = 4
+
+_fallback_limiter = None
+
+
+def set_fallback_threads(size):
+    '''set the max threads of the thread fallback'''
+    global FALLBACK_THREADS, _fallback_limiter
+    FALLBACK_THREADS = size
+    _fallback_limiter = None
+
+
+def _get_fallback_limiter():
+    global _fallback_limiter
+    if _fallback_limiter is None:
+        _fallback_limiter = anyio.CapacityLimiter(FALLBACK_THREADS)
+    return _fallback_limiter
+
 
 class Request(BaseRequest):
     '''
     the Request object
     '''
 
+    # leave the body unread, the callback reads it by Response.aiter_bytes,
+    # Response.aread or Response.save. sync request always reads the body
+    stream = False
+
+    # the max body size in bytes, None is unlimited
+    max_size = None
+
+    # a regex of the accepted content types, None accepts all
+    content_types = None
+
+    # what to do when the request failed:
+    #   off: raise the error
+    #   async: retry the async request once
+    #   thread: retry a sync request on the fallback threads, they are
+    #           bounded by FALLBACK_THREADS
+    fallback = 'thread'
+
     def _prepare_client(self, cls):
         transport = getattr(self, 'transport', None)
         proxies = getattr(self, 'proxy', None)
         timeout = int(self.timeout)
         return cls(transport=transport, timeout=timeout, proxies=proxies)
 
+    def set_client_pool(self, pool):
+        self.client_pool = pool
+
+    def get_client_pool(self):
+        pool = getattr(self, 'client_pool', None)
+        if pool is None and self.engine is not None:
+            pool = self.engine.client_pool
+        return pool
+
     def _prepare_request(self, client):
         method = self.method.lower()
         kwargs = self.kwargs.copy()
         url = self.url
-        return client.request(method, url, **kwargs)
+        send_kwargs = {}
+        for key in ['auth', 'follow_redirects']:
+            if key in kwargs:
+                send_kwargs[key] = kwargs.pop(key)
+        req = client.build_request(method, url, **kwargs)
+        return client.send(req, stream=True, **send_kwargs)
+
+    def _check_headers(self, rsp):
+        ct = rsp.headers.get('content-type', '')
+        if self.content_types and not re.search(self.content_types, ct, re.I):
+            raise IgnoreRequest(f'content type {ct} is not accepted')
+
+        size = rsp.headers.get('content-length')
+        if self.max_size and size and size.isdigit():
+            if int(size) > self.max_size:
+                raise IgnoreRequest(f'content length {size} is too large')
 
-    def _parse_response(self, rsp):
+    def _parse_response(self, rsp, close=None):
         method = self.method.lower()
         url = self.url
 
@@ -37,20 +98,90 @@ class Request(BaseRequest):
         rsp_url = urljoin(url, str(rsp.url))
         spider = self.spider
         logger.info(f'{method.upper()} {url} {status} {ct} {spider}')
-        content = rsp.content
-        return Response(rsp_url, content, rsp, status, ct, rsp.headers)
+        return Response(rsp_url,
+                        None,
+                        rsp,
+                        status,
+                        ct,
+                        rsp.headers,
+                        close=close,
+                        max_size=self.max_size)
+
+    async def _read_response(self, rsp, close):
+        try:
+            self._check_headers(rsp)
+            response = self._parse_response(rsp,
+                                            close if self.stream else None)
+            if self.engine is not None:
+                response.req = self
+                new_response = await self._process_headers(response)
+                if new_response is not response:
+                    await close()
+                    return new_response
+
+            if self.stream:
+                return response
+        except BaseException:
+            await close()
+            raise
+
+        try:
+            await response.aread()
+            return response
+        finally:
+            await close()
+
+    async def _process_headers(self, response):
+        '''
+        run the headers middlewares of the engine, their time is not counted
+        by request_time, and their errors are raised without the fallback
+        '''
+        start_time = time()
+        try:
+            return await self.engine.process_headers(response)
+        except Exception:
+            self.headers_failed = True
+            raise
+        finally:
+            self.headers_time += time() - start_time
 
     async def _async_request(self):
         self.sync = False
-        async with self._prepare_client(httpx.AsyncClient) as client:
+        pool = self.get_client_pool()
+        if pool is not None:
+            client = pool.get_client(proxy=getattr(self, 'proxy', None),
+                                     transport=getattr(self, 'transport',
+                                                       None),
+                                     timeout=int(self.timeout))
             rsp = await self._prepare_request(client)
-            return self._parse_response(rsp)
+            return await self._read_response(rsp, rsp.aclose)
+
+        client = self._prepare_client(httpx.AsyncClient)
+        try:
+            rsp = await self._prepare_request(client)
+        except BaseException:
+            await client.aclose()
+            raise
+
+        async def close():
+            try:
+                await rsp.aclose()
+            finally:
+                await client.aclose()
+
+        return await self._read_response(rsp, close)
 
     def _request(self):
         self.sync = True
         with self._prepare_client(httpx.Client) as client:
             rsp = self._prepare_request(client)
-            return self._parse_response(rsp)
+            try:
+                self._check_headers(rsp)
+                response = self._parse_response(rsp)
+                response.read()
+                return response
+            finally:
+                rsp.close()
 
     def set_cached(self, content, content_type):
         self.cached = Response(self.url, content, None, 200, content_type, {})
@@ -63,6 +194,9 @@ class Request(BaseRequest):
         >>> rsp = await req.request()
         '''
         start_time = time()
+        self.fallbacks = 0
+        self.headers_time = 0
+        self.headers_failed = False
 
         try:
             cached = getattr(self, 'cached', None)
@@ -73,10 +207,24 @@ class Request(BaseRequest):
                 return await anyio.to_thread.run_sync(self._request)
 
             return await self._async_request()
+        except (IgnoreRequest, RetryRequest):
+            raise
         except Exception as exc:
+            if self.headers_failed:
+                raise
+
             cls = str(exc.__class__)[8:-2]
             logger.error(cls + str(exc) + ': ' + self.url)
+            if self.fallback not in ['async', 'thread']:
+                raise
+
+            self.fallbacks = getattr(self, 'fallbacks', 0) + 1
             start_time = time()
-            return await anyio.to_thread.run_sync(self._request)
+            self.headers_time = 0
+            if self.fallback == 'async':
+                return await self._async_request()
+
+            return await anyio.to_thread.run_sync(
+                self._request, limiter=_get_fallback_limiter())
         finally:
-            self.request_time = time() - start_time
+            self.request_time = time() - start_time - self.headers_time
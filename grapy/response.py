@@ -1,22 +1,39 @@
 import re
-from bs4 import BeautifulSoup
 import json
+import codecs
 from io import BytesIO
+from .core.exceptions import IgnoreRequest
+from .parsers import make_soup, DEFAULT_PARSER
 
 try:
     import pdfplumber
 except Exception:
     pdfplumber = None
 
-RE_XML = re.compile('<?xml.+encoding=["\']([^\'"]+?)["\'].+?>', re.I)
-RE_HTML = re.compile('<meta.+charset=["\']([^\'"]+?)[\'"].+>', re.I)
+RE_XML = re.compile(b'<?xml.+encoding=["\']([^\'"]+?)["\'].+?>', re.I)
+RE_HTML = re.compile(b'<meta.+charset=["\']([^\'"]+?)[\'"].+>', re.I)
+
+# the charset declaration is searched on the head of document only
+SNIFF_SIZE = 8192
+
+BOMS = [
+    (codecs.BOM_UTF8, 'UTF-8-SIG'),
+    (codecs.BOM_UTF32_LE, 'UTF-32'),
+    (codecs.BOM_UTF32_BE, 'UTF-32'),
+    (codecs.BOM_UTF16_LE, 'UTF-16'),
+    (codecs.BOM_UTF16_BE, 'UTF-16'),
+]
 
 __all__ = ['Response']
 
 
 def safe_get_json(content):
-    idx0 = content.find(b'{')
-    idx1 = content.find(b'[')
+    if isinstance(content, str):
+        idx0 = content.find('{')
+        idx1 = content.find('[')
+    else:
+        idx0 = content.find(b'{')
+        idx1 = content.find(b'[')
 
     if idx0 > -1 and idx1 > -1:
         if idx0 < idx1:
@@ -36,8 +53,9 @@ def safe_get_json(content):
 class Response(object):
 
     __slots__ = [
-        'url', 'raw', 'encoding', 'content', '_soup', '_pdf', 'req', 'headers',
-        'status', 'content_type', '_close'
+        'url', 'raw', 'encoding', 'content', '_text', '_soup', '_pdf', 'req',
+        'headers', 'status', 'content_type', '_close', 'max_size',
+        'headers_processed', 'parser'
     ]
 
     def __init__(self,
@@ -47,9 +65,11 @@ class Response(object):
                  status,
                  content_type,
                  headers={},
-                 close=None):
+                 close=None,
+                 max_size=None):
         self.raw = raw
         self.url = url
+        self._text = None
         self._soup = None
         self._pdf = None
         self.encoding = None
@@ -59,41 +79,74 @@ class Response(object):
         self.status = status
         self.content_type = content_type
         self._close = close
+        self.max_size = max_size
+        self.headers_processed = False
+        self.parser = None
 
     @property
     def text(self):
-        'return the unicode document'
-        content = self.content
+        '''return the unicode document, it is decoded once and cached'''
+        if self._text is None:
+            self._text = self._decode(self.content)
+        return self._text
+
+    def _decode(self, content):
         if self.encoding:
             return str(content, self.encoding, errors='ignore')
 
         charset = self._get_charset(content)
         if charset:
-            self.encoding = charset
-            return str(content, charset, errors='ignore')
-        else:
             try:
-                self.encoding = 'GBK'
-                return str(content, 'GBK')
+                text = str(content, charset, errors='ignore')
+                self.encoding = charset
+                return text
+            except LookupError:
+                pass
+
+        for charset in ['UTF-8', 'GBK']:
+            try:
+                text = str(content, charset)
+                self.encoding = charset
+                return text
             except UnicodeDecodeError:
-                self.encoding = 'UTF-8'
-                return str(content, 'UTF-8', errors='ignore')
+                pass
+
+        self.encoding = 'UTF-8'
+        return str(content, 'UTF-8', errors='ignore')
 
     def json(self):
         '''return json document, maybe raise'''
-        data = self.content
-        data = safe_get_json(data)
-        data = json.loads(data.decode('utf-8', errors='ignore'))
+        data = safe_get_json(self.text)
+        data = json.loads(data)
         return data
 
     @property
     def soup(self):
-        '''return the instance of BeautifulSoup'''
+        '''
+        return the parsed document, the instance of BeautifulSoup by default.
+        the parser is choosed by Response.parser, Request.parser or
+        BaseSpider.parser
+        '''
         if self._soup is None:
             text = self.text
-            self._soup = BeautifulSoup(text, 'html.parser')
+            self._soup = make_soup(text, self._get_parser())
         return self._soup
 
+    def _get_parser(self):
+        if self.parser:
+            return self.parser
+
+        req = self.req
+        parser = getattr(req, 'parser', None)
+        if parser:
+            return parser
+
+        engine = getattr(req, 'engine', None)
+        if engine is not None and req.spider in engine.spiders:
+            parser = getattr(engine.spiders[req.spider], 'parser', None)
+
+        return parser or DEFAULT_PARSER
+
     def _get_charset(self, content):
 
         def map_charset(charset):
@@ -103,21 +156,25 @@ class Response(object):
                     charset = 'GBK'
             return charset
 
+        for bom, charset in BOMS:
+            if content.startswith(bom):
+                return charset
+
         ct = self.headers.get('content-type', '').lower()
         p = re.search('charset=(.+)$', ct)
         if p:
             charset = p.group(1)
             return map_charset(charset)
 
-        content = str(content, 'utf-8', errors='ignore')
-        xml = RE_XML.search(content)
+        head = content[:SNIFF_SIZE]
+        xml = RE_XML.search(head)
         if xml:
-            charset = xml.group(1)
+            charset = str(xml.group(1), 'ascii', errors='ignore')
             return map_charset(charset)
 
-        html = RE_HTML.search(content)
+        html = RE_HTML.search(head)
         if html:
-            charset = html.group(1)
+            charset = str(html.group(1), 'ascii', errors='ignore')
             return map_charset(charset)
 
         return None
@@ -176,6 +233,61 @@ class Response(object):
             self._pdf = pdfplumber.open(BytesIO(content))
         return self._pdf
 
+    def _check_size(self, size):
+        if self.max_size and size > self.max_size:
+            raise IgnoreRequest(f'body is larger than {self.max_size} bytes')
+
+    async def aiter_bytes(self, chunk_size=None):
+        '''
+        iterate the body by chunks without holding the whole payload,
+        raise IgnoreRequest if the body is larger than max_size
+
+        >>> async for chunk in rsp.aiter_bytes():
+        >>>     fp.write(chunk)
+        '''
+        if self.content is not None:
+            yield self.content
+            return
+
+        size = 0
+        async for chunk in self.raw.aiter_bytes(chunk_size):
+            size += len(chunk)
+            self._check_size(size)
+            yield chunk
+
+    def iter_bytes(self, chunk_size=None):
+        '''the sync version of aiter_bytes'''
+        if self.content is not None:
+            yield self.content
+            return
+
+        size = 0
+        for chunk in self.raw.iter_bytes(chunk_size):
+            size += len(chunk)
+            self._check_size(size)
+            yield chunk
+
+    async def aread(self):
+        '''read the whole body of a streaming response'''
+        if self.content is None:
+            self.content = b''.join([c async for c in self.aiter_bytes()])
+        return self.content
+
+    def read(self):
+        '''the sync version of aread'''
+        if self.content is None:
+            self.content = b''.join(self.iter_bytes())
+        return self.content
+
+    async def save(self, path, chunk_size=65536):
+        '''write the body to path by chunks, return the size'''
+        size = 0
+        with open(path, 'wb') as f:
+            async for chunk in self.aiter_bytes(chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+        return size
+
     def close(self):
         if self._close is not None:
             return self._close()
@@ -0,0 +1,71 @@
+from time import time
+import logging
+import random
+
+__all__ = ['RetryPolicy', 'CircuitBreaker']
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy(object):
+    '''
+    The exponential backoff with jitter of the failed requests.
+
+    @max_retries: the max retry count of a request, None is unlimited
+    @base: the delay (seconds) of the first retry
+    @cap: the max delay
+    @jitter: randomize the delay between the half and the whole of it
+    '''
+
+    def __init__(self, max_retries=10, base=1, cap=300, jitter=True):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+
+    def should_retry(self, retry):
+        return self.max_retries is None or retry <= self.max_retries
+
+    def get_delay(self, retry):
+        delay = min(self.cap, self.base * 2**max(retry - 1, 0))
+        if self.jitter:
+            delay = random.uniform(delay / 2, delay)
+        return delay
+
+
+class CircuitBreaker(object):
+    '''
+    Park a host after threshold continuous failures, the requests of a
+    parked host wait park_time seconds before they run.
+    '''
+
+    def __init__(self, threshold=5, park_time=60):
+        self.threshold = threshold
+        self.park_time = park_time
+        self._failures = {}
+        self._parked = {}
+
+    def success(self, host):
+        self._failures.pop(host, None)
+
+    def failure(self, host):
+        failures = self._failures.get(host, 0) + 1
+        if failures < self.threshold:
+            self._failures[host] = failures
+            return
+
+        self._failures.pop(host, None)
+        self._parked[host] = time() + self.park_time
+        logger.error(f'park {host} for {self.park_time} seconds')
+
+    def get_delay(self, host):
+        '''the seconds the host is still parked'''
+        until = self._parked.get(host)
+        if until is None:
+            return 0
+
+        delay = until - time()
+        if delay <= 0:
+            self._parked.pop(host)
+            return 0
+        return delay
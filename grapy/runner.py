@@ -0,0 +1,160 @@
+from .core import Engine, dump_request, load_request
+from .core.exceptions import IgnoreRequest
+from .utils import get_host
+import multiprocessing
+import multiprocessing.connection
+import asyncio
+import logging
+import queue
+import zlib
+import os
+
+__all__ = ['Runner', 'ShardRouter']
+
+logger = logging.getLogger(__name__)
+
+
+class ShardRouter(object):
+    '''
+    A before_push_request middleware, the requests are sharded by the url
+    host, the requests of other shards are forwarded to them.
+
+    It is put in front of the middlewares by Runner, so the middlewares
+    after it, eg: RequestFilter only see the requests of own shard, the
+    dedupe filter is partitioned by host.
+    '''
+
+    def __init__(self, shard, shards, inboxes, pending):
+        self.shard = shard
+        self.shards = shards
+        self.inboxes = inboxes
+        self.pending = pending
+
+    def get_shard(self, req):
+        host = get_host(req.url)
+        return zlib.crc32(bytes(host, 'utf-8')) % self.shards
+
+    def before_push_request(self, req):
+        shard = self.get_shard(req)
+        if shard == self.shard:
+            return
+
+        with self.pending.get_lock():
+            self.pending.value += 1
+        self.inboxes[shard].put(dump_request(req))
+        raise IgnoreRequest()
+
+
+class _Worker(object):
+
+    def __init__(self, setup, shard, shards, inboxes, pending, activity,
+                 idle, stop):
+        self.setup = setup
+        self.shard = shard
+        self.inbox = inboxes[shard]
+        self.pending = pending
+        self.activity = activity
+        self.idle = idle
+        self.stop = stop
+        self.router = ShardRouter(shard, shards, inboxes, pending)
+
+    async def receive(self, engine):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                payload = await loop.run_in_executor(None, self.inbox.get,
+                                                     True, 0.1)
+            except queue.Empty:
+                continue
+
+            try:
+                await engine.push_req(load_request(payload))
+            finally:
+                with self.activity.get_lock():
+                    self.activity.value += 1
+                with self.pending.get_lock():
+                    self.pending.value -= 1
+
+    async def run(self):
+        engine = Engine()
+        ret = self.setup(engine)
+        if asyncio.iscoroutine(ret):
+            await ret
+        engine.set_middlewares([self.router] + list(engine.middlewares))
+
+        receiver = asyncio.create_task(self.receive(engine))
+
+        if self.shard == 0:
+            await engine.start()
+
+        while not self.stop.is_set():
+            self.idle[self.shard] = int(engine.sched.is_idle())
+            await asyncio.sleep(0.1)
+
+        receiver.cancel()
+        await engine.sched.join()
+
+
+def _run_worker(*args):
+    asyncio.run(_Worker(*args).run())
+
+
+class Runner(object):
+    '''
+    Run the crawl on N worker processes, each one has it own Engine,
+    the requests are sharded by host with ShardRouter.
+
+    @setup: a function setup the Engine of the workers, it must be
+            picklable, eg: a function of module
+    @workers: the count of workers, default is the cpu count
+
+    >>> def setup(engine):
+    >>>     engine.set_sched(Scheduler(size=20))
+    >>>     engine.set_spiders([MySpider()])
+    >>>     engine.set_middlewares([RequestFilter()])
+    >>>
+    >>> Runner(setup, workers=4).run()
+    '''
+
+    def __init__(self, setup, workers=None, interval=0.5):
+        self.setup = setup
+        self.workers = workers or os.cpu_count()
+        self.interval = interval
+
+    def run(self):
+        shards = self.workers
+        inboxes = [multiprocessing.Queue() for _ in range(shards)]
+        pending = multiprocessing.Value('q', 0)
+        activity = multiprocessing.Value('q', 0)
+        idle = multiprocessing.Array('b', [0] * shards)
+        stop = multiprocessing.Event()
+
+        procs = []
+        for shard in range(shards):
+            proc = multiprocessing.Process(target=_run_worker,
+                                           args=(self.setup, shard, shards,
+                                                 inboxes, pending, activity,
+                                                 idle, stop))
+            proc.start()
+            procs.append(proc)
+
+        try:
+            self._wait(procs, pending, activity, idle)
+        finally:
+            stop.set()
+            for proc in procs:
+                proc.join()
+
+    def _wait(self, procs, pending, activity, idle):
+        # the crawl is done when nothing is forwarding, every worker is idle
+        # and nothing changed since the last check
+        last = None
+        while all(proc.is_alive() for proc in procs):
+            stat = (pending.value, activity.value, all(idle))
+            if stat[0] == 0 and stat[2] and stat == last:
+                return
+            last = stat
+            multiprocessing.connection.wait(
+                [proc.sentinel for proc in procs], self.interval)
+
+        logger.error('a worker exited unexpectedly')
@@ -3,23 +3,226 @@ from .core.exceptions import IgnoreRequest, RetryRequest, DropItem, ItemError
 from .core.item import load_item
 from asyncio_pool import AioPool
 from .request import Request
-from asyncio import sleep
+from .utils import get_host, Batcher
+from .retry import RetryPolicy
+from asyncio import sleep, gather, Event, get_event_loop
+from functools import partial
+from collections import OrderedDict, deque
+from contextvars import ContextVar, Context
 import logging
 from time import time
 
-__all__ = ['Scheduler', 'PeriodicScheduler']
+__all__ = [
+    'Scheduler', 'DomainScheduler', 'FrontierScheduler', 'PeriodicScheduler'
+]
 
 logger = logging.getLogger(__name__)
 
+# the token of the running request, the concurrent pushes of a request
+# (eg: gathered by the engine) share it, so a worker is blocked only once
+_in_worker = ContextVar('in_worker', default=None)
+
 
 class Scheduler(BaseScheduler):
+    '''
+    The in-process scheduler.
+
+    @size: the concurrency
+    @max_pending: the max requests wait in memory, push_req awaits when the
+                  queue is full. None is unbounded
+    @spill: an optional DiskQueue, when it is set the requests over
+            max_pending are spilled to disk instead of waiting
+    @retry_policy: the RetryPolicy of failed requests, default is
+                   RetryPolicy()
+    @breaker: an optional CircuitBreaker parks the failing hosts, the
+              requests of a parked host wait in memory until it is open,
+              they are counted by max_pending
+    '''
 
-    def __init__(self, size=10):
+    def __init__(self,
+                 size=10,
+                 max_pending=None,
+                 spill=None,
+                 retry_policy=None,
+                 breaker=None):
         BaseScheduler.__init__(self)
         self._pool = AioPool(size=size)
+        self._size = size
+        self._max_pending = max_pending
+        self._spill = spill
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._breaker = breaker
+        self._queue = deque()
+        self._active = 0
+        # the count of the blocked pushes by the worker token
+        self._blocked = {}
+        self._delayed = 0
+        # the requests of the parked hosts by host, every host has one timer
+        self._parked = {}
+        self._parked_count = 0
+        self._not_full = Event()
+        self._not_full.set()
+        self._done = Event()
+        self._done.set()
+
+    def _put(self, req):
+        self._queue.append(req)
+
+    def _get(self):
+        if self._queue:
+            return self._queue.popleft()
+        return None
+
+    def _qsize(self):
+        return len(self._queue)
+
+    def _task_done(self, req):
+        pass
+
+    def _is_full(self):
+        if self._max_pending is None:
+            return False
+        return self._qsize() + self._parked_count >= self._max_pending
+
+    def qsize(self):
+        '''the count of the requests wait in memory and on disk'''
+        size = self._qsize() + self._parked_count
+        if self._spill is not None:
+            size += len(self._spill)
+        return size
+
+    def is_idle(self):
+        '''no request is running or waiting'''
+        return self._done.is_set()
+
+    def running(self):
+        '''the count of the running requests'''
+        return self._active
+
+    @property
+    def size(self):
+        return self._size
 
     async def push_req(self, req):
-        self._pool.spawn_n(self.submit_req(req))
+        if self._spill is not None:
+            if len(self._spill) > 0 or self._is_full():
+                self._spill.push(req)
+                self._feed()
+                return
+
+        worker = _in_worker.get()
+        while self._is_full():
+            # every other running request is blocked on push, admit it over
+            # the bound, otherwise nobody will ever drain the queue. the
+            # parked requests do not count, their timers may be far away.
+            if worker is not None:
+                others = len(self._blocked) - (worker in self._blocked)
+                if others >= self._active - 1:
+                    break
+
+            self._not_full.clear()
+            if worker is not None:
+                self._blocked[worker] = self._blocked.get(worker, 0) + 1
+            try:
+                await self._not_full.wait()
+            finally:
+                if worker is not None:
+                    self._blocked[worker] -= 1
+                    if self._blocked[worker] == 0:
+                        self._blocked.pop(worker)
+
+        self._put(req)
+        self._feed()
+
+    def _feed(self):
+        while self._active < self._size:
+            req = self._get_ready()
+            if req is None:
+                break
+            self._active += 1
+            self._pool.spawn_n(self._submit_req(req))
+
+        if self._spill is not None:
+            while len(self._spill) > 0 and not self._is_full():
+                self._put(self._spill.pop())
+
+        # wake the blockers up as well when nobody else is left to drain the
+        # queue, one of them will be admitted over the bound.
+        if not self._is_full() or 0 < self._active <= len(self._blocked):
+            self._not_full.set()
+
+        if self._active == 0 and self.qsize() == 0 and self._delayed == 0:
+            self._done.set()
+        else:
+            self._done.clear()
+
+    def _get_ready(self):
+        '''the next request, the ones of the parked hosts are parked'''
+        while True:
+            req = self._get()
+            if req is None or self._breaker is None:
+                return req
+
+            host = get_host(req.url)
+            delay = self._breaker.get_delay(host)
+            if delay <= 0:
+                return req
+            self._park(host, req, delay)
+
+    def _park(self, host, req, delay):
+        self._task_done(req)
+        queue = self._parked.get(host)
+        if queue is None:
+            queue = deque()
+            self._parked[host] = queue
+            get_event_loop().call_later(delay, self._unpark, host)
+        queue.append(req)
+        self._parked_count += 1
+
+    def _unpark(self, host):
+        queue = self._parked.pop(host)
+        self._parked_count -= len(queue)
+        for req in queue:
+            self._put(req)
+        self._feed()
+
+    async def _submit_req(self, req):
+        _in_worker.set(object())
+        try:
+            await self.submit_req(req)
+        finally:
+            self._active -= 1
+            self._task_done(req)
+            self._feed()
+
+    def _push_later(self, req, delay):
+        self._delayed += 1
+        self._done.clear()
+        loop = get_event_loop()
+        # a new context, the delayed push is not run by a running request
+        loop.call_later(delay,
+                        loop.create_task,
+                        self._push_delayed(req),
+                        context=Context())
+
+    async def _push_delayed(self, req):
+        try:
+            await self.push_req(req)
+        finally:
+            self._delayed -= 1
+            self._feed()
+
+    def _retry(self, req):
+        if self._breaker is not None:
+            self._breaker.failure(get_host(req.url))
+
+        req.unique = False
+        req.retry += 1
+        if not self._retry_policy.should_retry(req.retry):
+            logger.error(f'give up {req.url} after {req.retry - 1} retries')
+            return
+
+        self._push_later(req, self._retry_policy.get_delay(req.retry))
 
     async def submit_req(self, req):
         try:
@@ -27,34 +230,229 @@ class Scheduler(BaseScheduler):
         except IgnoreRequest:
             pass
         except RetryRequest:
-            req.unique = False
-            await self.push_req(req)
+            self._retry(req)
+            return
         except Exception as e:
-            req.unique = False
-            await self.push_req(req)
             logger.exception(e)
+            self._retry(req)
+            return
+
+        if self._breaker is not None:
+            self._breaker.success(get_host(req.url))
 
     async def join(self):
+        await self._done.wait()
         await self._pool.join()
+        if self.engine is not None:
+            await self.engine.stop_metrics()
+
+
+class DomainScheduler(Scheduler):
+    '''
+    A host aware scheduler, every host has it own queue, the hosts are
+    dispatched round robin, the global size is still the overall ceiling.
+
+    @size: the global concurrency
+    @domain_size: the max concurrency per host
+    @delay: the min delay (seconds) between two requests of one host
+    @weight: the max requests of one host dispatched on each round
+    @domains: per host config, eg: {'example.com': {'size': 1, 'delay': 2}}
+    @max_pending, @spill, @retry_policy, @breaker: see Scheduler
+    '''
+
+    def __init__(self,
+                 size=10,
+                 domain_size=2,
+                 delay=0,
+                 weight=1,
+                 domains={},
+                 max_pending=None,
+                 spill=None,
+                 retry_policy=None,
+                 breaker=None):
+        Scheduler.__init__(self, size, max_pending, spill, retry_policy,
+                           breaker)
+        self._domain_size = domain_size
+        self._delay = delay
+        self._weight = weight
+        self._domains = domains
+        self._queues = OrderedDict()
+        self._count = 0
+        self._served = 0
+        self._served_host = None
+        self._running = {}
+        self._last_time = {}
+        self._timer = None
+
+    def _get_config(self, host, key, default):
+        return self._domains.get(host, {}).get(key, default)
+
+    def _put(self, req):
+        host = get_host(req.url)
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = deque()
+            self._queues[host] = queue
+        queue.append(req)
+        self._count += 1
+
+    def _get(self):
+        now = time()
+        wait = None
+        for host, queue in self._queues.items():
+            size = self._get_config(host, 'size', self._domain_size)
+            if self._running.get(host, 0) >= size:
+                continue
+
+            delay = self._get_config(host, 'delay', self._delay)
+            next_time = self._last_time.get(host, 0) + delay
+            if next_time > now:
+                if wait is None or next_time - now < wait:
+                    wait = next_time - now
+                continue
+
+            req = queue.popleft()
+            self._count -= 1
+            self._running[host] = self._running.get(host, 0) + 1
+            self._last_time[host] = now
+
+            # keep the host on the head until it served weight requests
+            if host != self._served_host:
+                self._served_host = host
+                self._served = 0
+            self._served += 1
+            weight = self._get_config(host, 'weight', self._weight)
+            if not queue:
+                self._queues.pop(host)
+                self._served = 0
+            elif self._served >= weight or delay > 0:
+                self._queues.move_to_end(host)
+                self._served = 0
+
+            return req
+
+        if wait is not None:
+            self._set_timer(wait)
+
+        return None
+
+    def _set_timer(self, wait):
+        loop = get_event_loop()
+        when = loop.time() + wait
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._feed()
+
+    def _qsize(self):
+        return self._count
+
+    def _task_done(self, req):
+        host = get_host(req.url)
+        self._running[host] -= 1
+        if self._running[host] == 0:
+            self._running.pop(host)
+
+
+class FrontierScheduler(Scheduler):
+    '''
+    A scheduler keeps all the requests on a persistent frontier, the
+    unfinished requests are resumed after a restart.
+
+    >>> sched = FrontierScheduler(SqliteQueue('frontier.db'), size=10)
+    >>> engine.set_sched(sched)
+    >>> if not await sched.resume():
+    >>>     await engine.start()
+    >>> await sched.join()
+    >>> sched.close()
+    '''
+
+    def __init__(self, frontier, size=10, retry_policy=None, breaker=None):
+        Scheduler.__init__(self,
+                           size,
+                           retry_policy=retry_policy,
+                           breaker=breaker)
+        self._frontier = frontier
+        # the ids of the popped requests will be put again (the delayed
+        # retries and the parked ones), their rows are kept until then
+        self._requeued = set()
+
+    def _put(self, req):
+        self._frontier.push(req)
+        if id(req) in self._requeued:
+            # the old row is deleted on the same commit as the new one
+            self._requeued.discard(id(req))
+            self._frontier.done(req)
+
+    def _push_later(self, req, delay):
+        self._requeued.add(id(req))
+        Scheduler._push_later(self, req, delay)
+
+    def _park(self, host, req, delay):
+        self._requeued.add(id(req))
+        Scheduler._park(self, host, req, delay)
+
+    def _get(self):
+        return self._frontier.pop()
+
+    def _qsize(self):
+        return len(self._frontier)
+
+    async def submit_req(self, req):
+        await Scheduler.submit_req(self, req)
+        # not on finally, a cancelled request is kept for the next run, and
+        # a delayed retry keeps its row until it is pushed again
+        if id(req) not in self._requeued:
+            self._frontier.done(req)
+
+    async def resume(self):
+        '''
+        start the requests left by the last run, return the count of them
+        '''
+        size = self._qsize()
+        logger.info(f'resume {size} requests')
+        self._feed()
+        return size
+
+    async def join(self):
+        await Scheduler.join(self)
+        self._frontier.checkpoint()
+
+    def close(self):
+        self._frontier.close()
 
 
 class PeriodicScheduler(BaseScheduler):
+    '''
+    A scheduler on the periodic job server, the requests and items pushed
+    in a short window are submitted together.
+    '''
 
-    async def push_req(self, req):
-        key = req.get_hash()
-        data = bytes(req)
-        pushed = False
+    async def _submit_job(self, func, key, data, kwargs):
         for i in range(self._retry_count):
             await sleep(i * 0.01)
             try:
-                await self._worker.submit_job('submit_req', key, data)
-                pushed = True
-                break
+                await self._worker.submit_job(func, key, data, **kwargs)
+                return
             except Exception as e:
                 logger.exception(e)
 
-        if not pushed:
-            raise Exception('PeriodicScheduler.push_req failed')
+        raise Exception(f'PeriodicScheduler.{func} failed')
+
+    async def _submit_jobs(self, func, jobs):
+        return await gather(
+            *[self._submit_job(func, *job) for job in jobs],
+            return_exceptions=True)
+
+    async def push_req(self, req):
+        key = req.get_hash()
+        data = bytes(req)
+        await self._req_batcher.submit((key, data, {}))
 
     async def submit_req(self, job):
         req = Request.build(job.workload)
@@ -63,37 +461,31 @@ class PeriodicScheduler(BaseScheduler):
         except IgnoreRequest:
             pass
         except RetryRequest:
-            return await job.sched_later(job.payload.count + 10, 1)
+            return await self._sched_later(job, req.url)
         except Exception as e:
             logger.exception(e)
-            return await job.sched_later(job.payload.count + 10, 1)
+            return await self._sched_later(job, req.url)
 
         await job.done()
 
+    async def _sched_later(self, job, name):
+        count = job.payload.count + 1
+        if not self._retry_policy.should_retry(count):
+            logger.error(f'give up {name} after {count - 1} retries')
+            return await job.done()
+
+        delay = int(self._retry_policy.get_delay(count)) + 1
+        await job.sched_later(delay, 1)
+
     async def push_item(self, item):
         key = item.get_hash()
         data = bytes(item)
-        pushed = False
-        for i in range(self._retry_count):
-            await sleep(i * 0.01)
-            try:
-
-                sched_at = int(time())
-                later = getattr(item, 'later', None)
-                if isinstance(later, int):
-                    sched_at += later
-
-                await self._worker.submit_job('submit_item',
-                                              key,
-                                              data,
-                                              sched_at=sched_at)
-                pushed = True
-                break
-            except Exception as e:
-                logger.exception(e)
+        sched_at = int(time())
+        later = getattr(item, 'later', None)
+        if isinstance(later, int):
+            sched_at += later
 
-        if not pushed:
-            raise Exception('PeriodicScheduler.push_item failed')
+        await self._item_batcher.submit((key, data, {'sched_at': sched_at}))
 
     async def submit_item(self, job):
         item = load_item(job.workload)
@@ -102,10 +494,10 @@ class PeriodicScheduler(BaseScheduler):
         except DropItem:
             pass
         except ItemError:
-            return await job.sched_later(job.payload.count + 10, 1)
+            return await self._sched_later(job, job.name)
         except Exception as e:
             logger.exception(e)
-            return await job.sched_later(job.payload.count + 10, 1)
+            return await self._sched_later(job, job.name)
 
         await job.done()
 
@@ -113,9 +505,18 @@ class PeriodicScheduler(BaseScheduler):
                    worker,
                    submit_req=True,
                    submit_item=True,
-                   retry_count=10):
+                   retry_count=10,
+                   batch_size=100,
+                   batch_interval=0.01,
+                   retry_policy=None):
         self._worker = worker
         self._retry_count = retry_count
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._req_batcher = Batcher(partial(self._submit_jobs, 'submit_req'),
+                                    batch_size, batch_interval)
+        self._item_batcher = Batcher(
+            partial(self._submit_jobs, 'submit_item'), batch_size,
+            batch_interval)
         if submit_req:
             await self._worker.add_func('submit_req', self.submit_req)
         if submit_item:
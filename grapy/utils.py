@@ -1,25 +1,35 @@
 from importlib import import_module as _import_module
+import asyncio
 import logging
 import glob
 import os.path
+from urllib.parse import urlsplit
 from .core.base_spider import BaseSpider
 
 __all__ = [
-    'import_module', 'import_spiders', 'middleware', 'make_spider',
-    'before_push_request', 'before_request', 'after_request'
+    'import_object', 'import_module', 'import_spiders', 'middleware',
+    'make_spider', 'before_push_request', 'before_request', 'after_headers',
+    'after_request', 'get_host', 'Batcher'
 ]
 
 logger = logging.getLogger(__name__)
 
 
+def import_object(name):
+    '''
+    import the object by name, eg: grapy.request.Request
+    '''
+    idx = name.rfind('.')
+    module = _import_module(name[:idx])
+    return getattr(module, name[idx + 1:])
+
+
 def import_module(module_name, *args, **kwargs):
     '''
     import the module and init it
     '''
     logger.debug('import module[%s]' % module_name)
-    idx = module_name.rfind('.')
-    module = _import_module(module_name[:idx])
-    obj = getattr(module, module_name[idx + 1:])
+    obj = import_object(module_name)
     return obj(*args, **kwargs)
 
 
@@ -76,8 +86,86 @@ def import_spiders(spider_path,
     return spiders
 
 
+def get_host(url):
+    '''
+    get the host (with port) of the url, lower case
+    '''
+    return urlsplit(url).netloc.lower()
+
+
+class Batcher(object):
+    '''
+    Coalesce the calls over a short window or a count threshold into one
+    bulk call, every caller still gets it own result.
+
+    @func: an async function func(values) returns the results of values,
+           a result is raised to the caller if it is an Exception
+    @max_size: call func when so many values are waiting
+    @interval: call func so many seconds after the first value waiting
+
+    >>> batcher = Batcher(check_keys, max_size=100, interval=0.01)
+    >>> exists = await batcher.submit(key)
+    '''
+
+    def __init__(self, func, max_size=100, interval=0.01):
+        self.func = func
+        self.max_size = max_size
+        self.interval = interval
+        self._values = []
+        self._futures = []
+        self._timer = None
+        # the running calls, the loop keeps only weak references of tasks
+        self._tasks = set()
+
+    async def submit(self, value):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._values.append(value)
+        self._futures.append(future)
+
+        if len(self._values) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.interval, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._values:
+            return
+
+        values = self._values
+        futures = self._futures
+        self._values = []
+        self._futures = []
+        task = asyncio.ensure_future(self._call(values, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, values, futures):
+        try:
+            results = await self.func(values)
+        except Exception as e:
+            results = [e] * len(values)
+
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
 class Middleware(object):
-    __slots__ = ['before_request', 'after_request', 'before_push_request']
+    __slots__ = [
+        'before_request', 'after_headers', 'after_request',
+        'before_push_request'
+    ]
 
 
 def middleware(name):
@@ -92,6 +180,7 @@ def middleware(name):
 
 before_push_request = middleware('before_push_request')
 before_request = middleware('before_request')
+after_headers = middleware('after_headers')
 after_request = middleware('after_request')
 
 
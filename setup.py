@@ -9,7 +9,7 @@ packages = [
 ]
 
 requires = [
-    'asyncio', 'beautifulsoup4', 'asyncio-pool', 'bloom-filter2', 'httpx[socks]'
+    'asyncio', 'beautifulsoup4', 'asyncio-pool', 'httpx[socks]'
 ]
 
 setup(